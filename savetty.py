@@ -2,21 +2,26 @@
 """
 savetty - Record keystrokes and screen state of TUI sessions
 
-Usage: python savetty.py <command> [args...]
+Usage: python savetty.py [--no-snapshots] <command> [args...]
 
 This tool wraps a TUI application transparently, recording all keystrokes
 including pauses. When the wrapped command exits, it prints the keystroke
 sequence to stdout in the format expected by testty.py.
 
 Additionally, whenever Enter is pressed, a screen snapshot is saved to
-snapshot001.txt, snapshot002.txt, etc.
+snapshot001.txt, snapshot002.txt, etc. Pass --no-snapshots to record
+keystrokes only.
 """
 
 import sys
 import os
+import copy
+import queue
+import threading
+import re
 import pty
 import time
-import select
+import selectors
 import termios
 import tty
 import struct
@@ -26,6 +31,10 @@ import signal
 # Import TerminalScreen from testty for screen rendering
 from testty import TerminalScreen
 
+# Bytes requested per read of the PTY, and reads made per select wakeup
+PTY_READ_SIZE = 32768
+PTY_READS_PER_WAKEUP = 8
+
 
 def get_terminal_size():
     """Get the current terminal size."""
@@ -42,39 +51,62 @@ def set_terminal_size(fd, rows, cols):
     fcntl.ioctl(fd, termios.TIOCSWINSZ, winsize)
 
 
+# Terminal responses we want to filter out:
+# - Cursor Position Report (CPR): ESC [ Pn ; Pn R  (response to ESC[6n)
+# - Device Attributes (DA): ESC [ ? Pn ; ... c or ESC [ > Pn ; ... c
+_TERMINAL_RESPONSE_RE = re.compile(rb'(\x1b\[[0-9;?>]*[Rc])')
+
+
 def is_terminal_response(data, i):
     """Check if data starting at position i is a terminal response sequence.
 
-    Terminal responses we want to filter out:
-    - Cursor Position Report (CPR): ESC [ Pn ; Pn R  (response to ESC[6n)
-    - Device Attributes (DA): ESC [ ? Pn ; ... c or ESC [ > Pn ; ... c
-
     Returns the length of the response sequence if found, 0 otherwise.
     """
-    if i >= len(data) or data[i] != 0x1b:
-        return 0
-
-    if i + 1 >= len(data) or data[i + 1] != ord('['):
-        return 0
-
-    # Look for the end of the CSI sequence
-    j = i + 2
-    while j < len(data):
-        c = data[j]
-        if c == ord('R'):
-            # Cursor Position Report: ESC [ row ; col R
-            return j - i + 1
-        elif c == ord('c'):
-            # Device Attributes response: ESC [ ... c
-            return j - i + 1
-        elif c in b'0123456789;?>' or (c >= ord('0') and c <= ord('9')):
-            # Continue parsing parameters
-            j += 1
-        else:
-            # Unknown sequence, not a terminal response we recognize
-            break
-
-    return 0
+    m = _TERMINAL_RESPONSE_RE.match(data, i)
+    return m.end() - i if m else 0
+
+
+# Hex escape for every byte value
+_HEX = tuple(sys.intern(f"\\x{_b:02x}") for _b in range(256))
+
+# Token emitted for each input byte, built once at import time so recording
+# a keystroke is a single indexed load instead of a cascade of comparisons.
+_BYTE_TOKEN = [None] * 256
+for _b in range(0x20):
+    # Control characters map back to their letter
+    _BYTE_TOKEN[_b] = f"[ctrl-{chr(_b + ord('a') - 1)}]"
+for _b in range(0x20, 0x7f):
+    _BYTE_TOKEN[_b] = chr(_b)
+# Non-ASCII bytes are represented as hex escapes
+_BYTE_TOKEN[0x80:] = _HEX[0x80:]
+_BYTE_TOKEN[0x1b] = "[esc]"
+_BYTE_TOKEN[0x0d] = _BYTE_TOKEN[0x0a] = "[enter]"
+_BYTE_TOKEN[0x09] = "[tab]"
+_BYTE_TOKEN[0x7f] = "[backspace]"
+_BYTE_TOKEN = tuple(sys.intern(t) for t in _BYTE_TOKEN)
+_BYTE_TOKEN_BYTES = tuple(t.encode('ascii') for t in _BYTE_TOKEN)
+_IS_ENTER = bytes(1 if _b in (0x0a, 0x0d) else 0 for _b in range(256))
+del _b
+
+
+# Arrow and delete keys, keyed by the bytes following ESC [
+_CSI_KEYS = {
+    b'A': b"[up]",
+    b'B': b"[down]",
+    b'C': b"[right]",
+    b'D': b"[left]",
+    b'3~': b"[delete]",
+}
+
+
+def sleep_token(last_time, current_time, min_sleep_threshold_ms):
+    """Return a [sleep:N] token if the pause since last_time is long enough."""
+    if last_time is not None:
+        elapsed = current_time - last_time
+        # Compare before formatting; most keystrokes follow the last one closely
+        if elapsed >= min_sleep_threshold_ms * 0.001:
+            return b"[sleep:%d]" % int(elapsed * 1000)
+    return None
 
 
 def byte_to_sequence(b, last_time, current_time, min_sleep_threshold_ms=100):
@@ -84,35 +116,14 @@ def byte_to_sequence(b, last_time, current_time, min_sleep_threshold_ms=100):
     of strings representing the sequence, and is_enter is True if this was an Enter key.
     """
     parts = []
-    is_enter = False
 
     # Check if we need a sleep token
-    if last_time is not None:
-        elapsed_ms = int((current_time - last_time) * 1000)
-        if elapsed_ms >= min_sleep_threshold_ms:
-            parts.append(f"[sleep:{elapsed_ms}]")
-
-    # Convert the byte to its sequence representation
-    if b == 0x1b:  # Escape
-        parts.append("[esc]")
-    elif b == 0x0d or b == 0x0a:  # Enter (CR or LF)
-        parts.append("[enter]")
-        is_enter = True
-    elif b == 0x09:  # Tab
-        parts.append("[tab]")
-    elif b == 0x7f:  # Backspace (DEL)
-        parts.append("[backspace]")
-    elif b < 0x20:  # Control characters
-        # Convert control character back to letter
-        letter = chr(b + ord('a') - 1)
-        parts.append(f"[ctrl-{letter}]")
-    elif b >= 0x20 and b < 0x7f:  # Printable ASCII
-        parts.append(chr(b))
-    else:
-        # Non-ASCII byte, represent as hex escape
-        parts.append(f"\\x{b:02x}")
+    sleep = sleep_token(last_time, current_time, min_sleep_threshold_ms)
+    if sleep:
+        parts.append(sleep.decode('ascii'))
 
-    return parts, is_enter
+    parts.append(_BYTE_TOKEN[b])
+    return parts, bool(_IS_ENTER[b])
 
 
 def escape_sequence_to_token(seq):
@@ -129,105 +140,146 @@ def escape_sequence_to_token(seq):
         return "[delete]"
     else:
         # Unknown escape sequence, return raw bytes
-        return ''.join(f"\\x{b:02x}" for b in seq)
+        return ''.join([_HEX[b] for b in seq])
+
+
+# Splits a chunk of input in one pass into terminal responses (skipped), runs
+# of printable ASCII (recorded verbatim), arrow/delete key sequences, and any
+# other single byte.
+_INPUT_RE = re.compile(
+    _TERMINAL_RESPONSE_RE.pattern + rb'|([\x20-\x7e]+)|\x1b\[([ABCD]|3~)|(.)',
+    re.DOTALL,
+)
 
 
 def process_input_bytes(data, recorded_sequence, last_key_time, snapshot_count, screen, min_sleep_threshold_ms=100):
-    """Process input bytes and update recorded sequence.
+    """Process input bytes and append their tokens to recorded_sequence (a bytearray).
 
-    Returns (updated_last_key_time, updated_snapshot_count, list of enter positions).
+    Returns (updated_last_key_time, updated_snapshot_count, list of snapshot
+    numbers), with one new snapshot number for each Enter in data.
     """
     current_time = time.time()
-    enter_positions = []
-    i = 0
-
-    while i < len(data):
-        byte = data[i]
-
-        # Check for escape sequences
-        if byte == 0x1b and i + 1 < len(data):
-            # Potential escape sequence
-            if i + 2 < len(data) and data[i+1] == ord('['):
-                # CSI sequence
-                if data[i+2] == ord('A'):
-                    # Check for sleep
-                    if last_key_time is not None:
-                        elapsed_ms = int((current_time - last_key_time) * 1000)
-                        if elapsed_ms >= min_sleep_threshold_ms:
-                            recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                    recorded_sequence.append("[up]")
-                    i += 3
-                    last_key_time = current_time
-                    continue
-                elif data[i+2] == ord('B'):
-                    if last_key_time is not None:
-                        elapsed_ms = int((current_time - last_key_time) * 1000)
-                        if elapsed_ms >= min_sleep_threshold_ms:
-                            recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                    recorded_sequence.append("[down]")
-                    i += 3
-                    last_key_time = current_time
-                    continue
-                elif data[i+2] == ord('C'):
-                    if last_key_time is not None:
-                        elapsed_ms = int((current_time - last_key_time) * 1000)
-                        if elapsed_ms >= min_sleep_threshold_ms:
-                            recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                    recorded_sequence.append("[right]")
-                    i += 3
-                    last_key_time = current_time
-                    continue
-                elif data[i+2] == ord('D'):
-                    if last_key_time is not None:
-                        elapsed_ms = int((current_time - last_key_time) * 1000)
-                        if elapsed_ms >= min_sleep_threshold_ms:
-                            recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                    recorded_sequence.append("[left]")
-                    i += 3
-                    last_key_time = current_time
-                    continue
-                elif i + 3 < len(data) and data[i+2] == ord('3') and data[i+3] == ord('~'):
-                    if last_key_time is not None:
-                        elapsed_ms = int((current_time - last_key_time) * 1000)
-                        if elapsed_ms >= min_sleep_threshold_ms:
-                            recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                    recorded_sequence.append("[delete]")
-                    i += 4
-                    last_key_time = current_time
-                    continue
-
-        # Regular byte processing
-        parts, is_enter = byte_to_sequence(byte, last_key_time, current_time, min_sleep_threshold_ms)
-        recorded_sequence.extend(parts)
+    snap_nums = []
+
+    # Every byte in the chunk shares current_time, so only the first
+    # recorded token can follow a pause
+    pause = sleep_token(last_key_time, current_time, min_sleep_threshold_ms)
+
+    if len(data) == 1:
+        # Typing delivers one key per read; a table lookup covers every byte
+        byte = data[0]
+        if pause:
+            recorded_sequence += pause
+        recorded_sequence += _BYTE_TOKEN_BYTES[byte]
+        if _IS_ENTER[byte]:
+            snapshot_count += 1
+            snap_nums.append(snapshot_count)
+        return current_time, snapshot_count, snap_nums
+
+    for m in _INPUT_RE.finditer(data):
+        kind = m.lastindex
+        if kind == 1:
+            # Terminal response to a query, not user input
+            continue
+        if pause:
+            recorded_sequence += pause
+            pause = None
         last_key_time = current_time
+        if kind == 2:
+            recorded_sequence += m.group(2)
+        elif kind == 3:
+            recorded_sequence += _CSI_KEYS[m.group(3)]
+        else:
+            byte = data[m.start()]
+            recorded_sequence += _BYTE_TOKEN_BYTES[byte]
+            if _IS_ENTER[byte]:
+                snapshot_count += 1
+                snap_nums.append(snapshot_count)
 
-        if is_enter:
-            # Record the position for snapshot
-            enter_positions.append((len(recorded_sequence), snapshot_count + len(enter_positions) + 1))
+    return last_key_time, snapshot_count, snap_nums
 
-        i += 1
 
-    return last_key_time, snapshot_count + len(enter_positions), enter_positions
+def snapshot_filename(snapshot_num, output_dir="."):
+    """Return the path of the snapshot file for snapshot_num."""
+    return os.path.join(output_dir, f"snapshot{snapshot_num:03d}.txt")
 
 
 def save_snapshot(screen, snapshot_num, output_dir="."):
     """Save the current screen state to a snapshot file."""
-    filename = os.path.join(output_dir, f"snapshot{snapshot_num:03d}.txt")
-    screen_text = screen.get_screen_text()
-    with open(filename, 'w') as f:
-        f.write(screen_text)
-        if screen_text and not screen_text.endswith('\n'):
-            f.write('\n')
+    filename = snapshot_filename(snapshot_num, output_dir)
+    screen_text = screen.get_screen_text().encode()
+    parts = [screen_text]
+    if screen_text and not screen_text.endswith(b'\n'):
+        parts.append(b'\n')
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        os.writev(fd, parts)
+    finally:
+        os.close(fd)
     return filename
 
 
-def run_with_recording(command, output_dir=".", min_sleep_threshold_ms=500):
+def copy_screen(screen):
+    """Return a copy of screen that later output won't modify."""
+    snap = copy.copy(screen)
+    snap.buffer = screen.buffer[:]
+    return snap
+
+
+def feed_pending_output(screen, pending_output):
+    """Feed buffered PTY output to the screen emulator, emptying the buffer."""
+    if pending_output:
+        data = b''.join(pending_output)
+        pending_output.clear()
+        screen.process_output(data)
+
+
+def apply_resize(screen, pending_output, rows, cols):
+    """Resize screen, after emulating output the program drew at the old size."""
+    feed_pending_output(screen, pending_output)
+    screen.resize(rows, cols)
+
+
+def snapshot_writer(snapshot_queue, output_dir=".", failures=None):
+    """Save queued (snapshot_num, screen) pairs until None is queued.
+
+    A snapshot that cannot be saved doesn't stop the ones after it; its
+    (snapshot_num, exception) pair is appended to failures instead.
+    """
+    for snap_num, snap in iter(snapshot_queue.get, None):
+        try:
+            save_snapshot(snap, snap_num, output_dir)
+        except Exception as e:
+            if failures is not None:
+                failures.append((snap_num, e))
+
+
+def make_read_selector(fds):
+    """Return a selector watching fds for reading.
+
+    epoll, the default on Linux, refuses regular files and /dev/null, which
+    stdin may be when input is redirected; select() is used for those.
+    """
+    sel = selectors.DefaultSelector()
+    try:
+        for fd in fds:
+            sel.register(fd, selectors.EVENT_READ)
+    except PermissionError:
+        sel.close()
+        sel = selectors.SelectSelector()
+        for fd in fds:
+            sel.register(fd, selectors.EVENT_READ)
+    return sel
+
+
+def run_with_recording(command, output_dir=".", min_sleep_threshold_ms=500, snapshot=True):
     """Run a command in a PTY, recording keystrokes and screen snapshots.
 
     Args:
         command: List of command and arguments to run
         output_dir: Directory to save snapshot files
         min_sleep_threshold_ms: Minimum pause duration to record as [sleep:N]
+        snapshot: Whether to save a snapshot (and EXPECT_SCREEN marker) on Enter
 
     Returns:
         A tuple of (keystroke_sequence, snapshot_files, rows, cols) where:
@@ -237,11 +289,21 @@ def run_with_recording(command, output_dir=".", min_sleep_threshold_ms=500):
     """
     rows, cols = get_terminal_size()
     screen = TerminalScreen(rows, cols)
-    recorded_sequence = []
+    # PTY output not yet fed to the screen; it is only emulated when a
+    # snapshot needs it
+    pending_output = []
+    recorded_sequence = bytearray()
     snapshot_count = 0
     snapshot_files = []
     last_key_time = None
-    pending_snapshots = []  # List of (sequence_position, snapshot_num)
+    pending_snapshots = []  # Snapshot numbers waiting for output to settle
+
+    # Snapshots are rendered and written on a separate thread so the pump
+    # only pays for copying the screen buffer
+    snapshot_queue = queue.Queue()
+    snapshot_failures = []
+    writer = threading.Thread(target=snapshot_writer,
+                              args=(snapshot_queue, output_dir, snapshot_failures))
 
     # Create PTY
     master_fd, slave_fd = pty.openpty()
@@ -250,10 +312,20 @@ def run_with_recording(command, output_dir=".", min_sleep_threshold_ms=500):
     # Save original terminal settings
     old_settings = None
     stdin_fd = sys.stdin.fileno()
-    try:
-        old_settings = termios.tcgetattr(stdin_fd)
-    except termios.error:
-        pass
+    stdout_fd = sys.stdout.fileno()
+    if os.isatty(stdin_fd):
+        try:
+            old_settings = termios.tcgetattr(stdin_fd)
+        except termios.error:
+            pass
+
+    # Signals (notably SIGCHLD when the child exits) write to this pipe, so
+    # the pump can block in select instead of polling waitpid on a timer
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    old_wakeup_fd = signal.set_wakeup_fd(wakeup_w)
+    old_sigchld = signal.signal(signal.SIGCHLD, lambda signum, frame: None)
 
     pid = os.fork()
 
@@ -285,154 +357,145 @@ def run_with_recording(command, output_dir=".", min_sleep_threshold_ms=500):
             tty.setraw(stdin_fd)
 
         # Set master_fd to non-blocking
-        flags = fcntl.fcntl(master_fd, fcntl.F_GETFL)
-        fcntl.fcntl(master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        os.set_blocking(master_fd, False)
+
+        # Handle window resize. The handler can run in the middle of
+        # emulating output or copying the screen, so it only records the
+        # resize; the pump applies it between reads. SIGWINCH also writes
+        # to the wakeup fd, so the pump notices straight away.
+        resize_pending = False
 
-        # Handle window resize
         def handle_sigwinch(signum, frame):
-            nonlocal rows, cols, screen
-            rows, cols = get_terminal_size()
-            set_terminal_size(master_fd, rows, cols)
-            # Resize screen emulator
-            screen = TerminalScreen(rows, cols)
+            nonlocal resize_pending
+            resize_pending = True
 
         signal.signal(signal.SIGWINCH, handle_sigwinch)
 
+        writer.start()
+
+        # Set once reading the PTY fails, i.e. the child closed its side
+        pty_closed = False
+        sel = None
+
         try:
+            # Wait for input from either stdin or the PTY
+            sel = make_read_selector([stdin_fd, master_fd, wakeup_r])
+
             while True:
-                # Wait for input from either stdin or the PTY
                 try:
-                    readable, _, _ = select.select([stdin_fd, master_fd], [], [], 0.1)
+                    events = sel.select()
                 except (ValueError, OSError):
                     break
 
-                # Check if child process has exited
-                try:
-                    wpid, status = os.waitpid(pid, os.WNOHANG)
+                woken = False
+                for key, _ in events:
+                    if key.fd == wakeup_r:
+                        woken = True
+                        try:
+                            while os.read(wakeup_r, 512):
+                                pass
+                        except BlockingIOError:
+                            pass
+
+                if resize_pending:
+                    # Cleared before reading the size, so a resize that
+                    # lands meanwhile is applied on the next wakeup
+                    resize_pending = False
+                    rows, cols = get_terminal_size()
+                    set_terminal_size(master_fd, rows, cols)
+                    apply_resize(screen, pending_output, rows, cols)
+
+                # Check if child process has exited. Exiting raises SIGCHLD
+                # and hangs up the PTY, so only those need waitpid.
+                if woken or pty_closed:
+                    try:
+                        wpid, status = os.waitpid(pid, os.WNOHANG)
+                    except ChildProcessError:
+                        break
                     if wpid == pid:
                         # Child exited, drain any remaining output
+                        chunks = []
                         try:
                             while True:
-                                chunk = os.read(master_fd, 4096)
+                                chunk = os.read(master_fd, PTY_READ_SIZE)
                                 if not chunk:
                                     break
-                                os.write(sys.stdout.fileno(), chunk)
-                                screen.process_output(chunk)
+                                chunks.append(chunk)
                         except (OSError, BlockingIOError):
                             pass
+                        if chunks:
+                            os.writev(stdout_fd, chunks)
                         break
-                except ChildProcessError:
-                    break
 
-                for fd in readable:
+                for key, _ in events:
+                    fd = key.fd
                     if fd == stdin_fd:
                         # Read from stdin and forward to PTY
                         try:
                             data = os.read(stdin_fd, 1024)
                             if not data:
+                                # End of input stays readable; stop watching it
+                                sel.unregister(stdin_fd)
                                 continue
 
                             # Forward to child
                             os.write(master_fd, data)
 
-                            # Record the keystrokes
-                            current_time = time.time()
-                            i = 0
-                            while i < len(data):
-                                byte = data[i]
-
-                                # Check for and skip terminal response sequences
-                                # These are sent by the terminal in response to queries (e.g., cursor position)
-                                response_len = is_terminal_response(data, i)
-                                if response_len > 0:
-                                    i += response_len
-                                    continue
-
-                                # Check for escape sequences (user input)
-                                if byte == 0x1b and i + 2 < len(data) and data[i+1] == ord('['):
-                                    # CSI sequence
-                                    if data[i+2] == ord('A'):
-                                        if last_key_time is not None:
-                                            elapsed_ms = int((current_time - last_key_time) * 1000)
-                                            if elapsed_ms >= min_sleep_threshold_ms:
-                                                recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                                        recorded_sequence.append("[up]")
-                                        i += 3
-                                        last_key_time = current_time
-                                        continue
-                                    elif data[i+2] == ord('B'):
-                                        if last_key_time is not None:
-                                            elapsed_ms = int((current_time - last_key_time) * 1000)
-                                            if elapsed_ms >= min_sleep_threshold_ms:
-                                                recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                                        recorded_sequence.append("[down]")
-                                        i += 3
-                                        last_key_time = current_time
-                                        continue
-                                    elif data[i+2] == ord('C'):
-                                        if last_key_time is not None:
-                                            elapsed_ms = int((current_time - last_key_time) * 1000)
-                                            if elapsed_ms >= min_sleep_threshold_ms:
-                                                recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                                        recorded_sequence.append("[right]")
-                                        i += 3
-                                        last_key_time = current_time
-                                        continue
-                                    elif data[i+2] == ord('D'):
-                                        if last_key_time is not None:
-                                            elapsed_ms = int((current_time - last_key_time) * 1000)
-                                            if elapsed_ms >= min_sleep_threshold_ms:
-                                                recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                                        recorded_sequence.append("[left]")
-                                        i += 3
-                                        last_key_time = current_time
-                                        continue
-                                    elif i + 3 < len(data) and data[i+2] == ord('3') and data[i+3] == ord('~'):
-                                        if last_key_time is not None:
-                                            elapsed_ms = int((current_time - last_key_time) * 1000)
-                                            if elapsed_ms >= min_sleep_threshold_ms:
-                                                recorded_sequence.append(f"[sleep:{elapsed_ms}]")
-                                        recorded_sequence.append("[delete]")
-                                        i += 4
-                                        last_key_time = current_time
-                                        continue
-
-                                # Regular byte processing
-                                parts, is_enter = byte_to_sequence(byte, last_key_time, current_time, min_sleep_threshold_ms)
-                                recorded_sequence.extend(parts)
-                                last_key_time = current_time
-
-                                if is_enter:
-                                    # Schedule a snapshot to be taken after output is processed
-                                    snapshot_count += 1
-                                    pending_snapshots.append(snapshot_count)
-
-                                i += 1
-
+                            # Record the keystrokes; snapshots are taken after output is processed
+                            last_key_time, snapshot_count, snap_nums = process_input_bytes(
+                                data, recorded_sequence, last_key_time, snapshot_count,
+                                screen, min_sleep_threshold_ms)
+                            if snapshot:
+                                pending_snapshots.extend(snap_nums)
                         except (OSError, BlockingIOError):
                             pass
 
                     elif fd == master_fd:
-                        # Read from PTY and forward to stdout
+                        # Drain the PTY, then forward it all to stdout in one write.
+                        # Reads per wakeup are capped so a program flooding its
+                        # output cannot starve keyboard input.
+                        chunks = []
                         try:
-                            chunk = os.read(master_fd, 4096)
-                            if chunk:
-                                os.write(sys.stdout.fileno(), chunk)
-                                screen.process_output(chunk)
-
-                                # Save any pending snapshots after output is processed
-                                for snap_num in pending_snapshots:
-                                    filename = save_snapshot(screen, snap_num, output_dir)
-                                    snapshot_files.append(filename)
-                                    # Insert EXPECT_SCREEN marker into recorded sequence
-                                    recorded_sequence.append(f"[EXPECT_SCREEN:snapshot{snap_num:03d}.txt]")
-                                pending_snapshots = []
-                        except (OSError, BlockingIOError):
+                            for _ in range(PTY_READS_PER_WAKEUP):
+                                chunk = os.read(master_fd, PTY_READ_SIZE)
+                                if not chunk:
+                                    break
+                                chunks.append(chunk)
+                        except BlockingIOError:
                             pass
+                        except OSError:
+                            pty_closed = True
+
+                        if chunks:
+                            os.writev(stdout_fd, chunks)
+                            if snapshot:
+                                pending_output.extend(chunks)
+                                # Keep the backlog bounded during long runs without Enter
+                                if pending_snapshots or len(pending_output) >= 256:
+                                    feed_pending_output(screen, pending_output)
+
+                            # Save any pending snapshots after output is processed
+                            for snap_num in pending_snapshots:
+                                snapshot_queue.put((snap_num, copy_screen(screen)))
+                                snapshot_files.append(snapshot_filename(snap_num, output_dir))
+                                # Insert EXPECT_SCREEN marker into recorded sequence
+                                recorded_sequence += b"[EXPECT_SCREEN:snapshot%03d.txt]" % snap_num
+                            pending_snapshots = []
 
         except KeyboardInterrupt:
             pass
         finally:
+            if sel is not None:
+                sel.close()
+            signal.set_wakeup_fd(old_wakeup_fd)
+            signal.signal(signal.SIGCHLD, old_sigchld)
+            os.close(wakeup_r)
+            os.close(wakeup_w)
+
+            # Let the writer finish any queued snapshots
+            snapshot_queue.put(None)
+            writer.join()
+
             # Restore terminal settings
             if old_settings is not None:
                 termios.tcsetattr(stdin_fd, termios.TCSADRAIN, old_settings)
@@ -446,22 +509,35 @@ def run_with_recording(command, output_dir=".", min_sleep_threshold_ms=500):
             except (ProcessLookupError, ChildProcessError):
                 pass
 
+    # Report snapshots the writer couldn't save, now the terminal is back to normal
+    for snap_num, error in snapshot_failures:
+        filename = snapshot_filename(snap_num, output_dir)
+        print(f"Failed to save snapshot {filename}: {error}", file=sys.stderr)
+        snapshot_files.remove(filename)
+
     # Build the final sequence string
-    sequence = ''.join(recorded_sequence)
+    sequence = recorded_sequence.decode('ascii')
     return sequence, snapshot_files, rows, cols
 
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python savetty.py <command> [args...]", file=sys.stderr)
+    args = sys.argv[1:]
+    # Options come before the command so the command's own flags pass through
+    snapshot = True
+    if args and args[0] == '--no-snapshots':
+        snapshot = False
+        args = args[1:]
+
+    if not args:
+        print("Usage: python savetty.py [--no-snapshots] <command> [args...]", file=sys.stderr)
         print("\nRecord keystrokes and screen snapshots from a TUI session.", file=sys.stderr)
         print("Prints the testty command to stdout when the session ends.", file=sys.stderr)
         sys.exit(1)
 
-    command = sys.argv[1:]
+    command = args
 
     # Run the recording
-    sequence, snapshot_files, rows, cols = run_with_recording(command)
+    sequence, snapshot_files, rows, cols = run_with_recording(command, snapshot=snapshot)
 
     # Build the full testty command
     cmd_str = ' '.join(command)
@@ -3,32 +3,205 @@
 Test suite for dim editor using unittest framework
 """
 
+import io
 import sys
 import os
+import pickle
+import re
+import time
+import contextlib
+import fnmatch
+import functools
+import hashlib
+import shutil
+import subprocess
+import tempfile
 import unittest
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
 # Import testty functions
 sys.path.insert(0, os.path.dirname(__file__))
 from testty import run_with_pty, parse_input_string
 
+# Absolute path so tests can run dim from a scratch directory
+SOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+DIM_BIN = os.path.join(SOURCE_DIR, "dim")
 
-class TestDimQuit(unittest.TestCase):
+_dim_ready = False
+
+
+def ensure_dim_built():
+    """Build dim once per run if it is missing or older than its sources.
+
+    make decides, so a binary already built by `make` (or `make asan`)
+    is used as is instead of being compiled again.
+    """
+    global _dim_ready
+    if _dim_ready:
+        return
+    build = subprocess.run(["make", "dim"], cwd=SOURCE_DIR,
+                           capture_output=True, text=True)
+    if build.returncode != 0 or not os.access(DIM_BIN, os.X_OK):
+        raise RuntimeError(f"`make dim` failed:\n{build.stderr}")
+    warm_page_cache()
+    _dim_ready = True
+
+
+# Files every run reads: the binary and the fixtures the tests open
+FIXTURE_FILES = ("hello_world.txt", "example.py", "example.c", "README.md")
+
+
+def warm_page_cache():
+    """Ask the kernel to read dim and the fixture files into the page cache.
+
+    Keeps cold-cache disk reads out of the first tests' timings on a fresh
+    machine. Only a hint, and skipped where posix_fadvise is unavailable.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    for path in (DIM_BIN, *(os.path.join(SOURCE_DIR, name) for name in FIXTURE_FILES)):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+
+def setUpModule():
+    """Build dim once if needed, rather than failing every test."""
+    ensure_dim_built()
+
+
+# Tests that exercise timeouts by sleeping are skipped unless this is set;
+# `make test` sets it so the full suite still runs there
+RUN_SLOW_TESTS = os.environ.get("DIM_SLOW_TESTS") == "1"
+slow_test = unittest.skipUnless(RUN_SLOW_TESTS, "slow timing test; set DIM_SLOW_TESTS=1 to run")
+
+# Keep scratch files in RAM where a tmpfs is available
+SCRATCH_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+# PTY settings shared by every test
+RUN_DIM_OPTIONS = dict(delay_ms=0, timeout=0.5, rows=24, cols=80)
+
+
+def run_dim(*args, keys, **overrides):
+    """Run dim with args under a PTY, typing keys, and return the Result.
+
+    keys is an input string or a list of parsed tokens. The PTY settings
+    shared by every test are filled in; pass keyword overrides (rows, cols,
+    cwd, ...) to change them.
+    """
+    if isinstance(keys, str):
+        keys = parse_input_string(keys)
+    options = dict(RUN_DIM_OPTIONS, **overrides)
+    return run_with_pty(command=[DIM_BIN, *args], input_tokens=keys, **options)
+
+
+# Wait for the editor to draw, enter insert mode, then quit without changes.
+OPEN_AND_QUIT = parse_input_string("[wait:NORMAL]i[ctrl-q]")
+
+
+# With DIM_PTY_CACHE=1, open_file_snapshot() results persist across runs here
+PTY_CACHE_DIR = os.path.join(SOURCE_DIR, ".dim_pty_cache") if os.environ.get("DIM_PTY_CACHE") == "1" else None
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(path):
+    """Return the sha256 hex digest of a file's contents."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def open_file_snapshot(*args, rows=24, cols=80):
+    """Open dim with args, let it draw, quit, and return the Result.
+
+    Several tests only inspect the first screen of a file; they share one run
+    per file and window size (per worker process) instead of each launching
+    dim. Tests that only read the status bar can ask for a smaller window.
+
+    If PTY_CACHE_DIR is set, the Result is also stored on disk, keyed by the
+    dim binary, testty.py (which emulates the screen and builds the
+    Result), the keys typed, the PTY options, the opened files' contents
+    and the window size, so later runs reuse it without launching dim at
+    all.
+    """
+    if PTY_CACHE_DIR is None:
+        return run_dim(*args, keys=OPEN_AND_QUIT, rows=rows, cols=cols)
+
+    key = hashlib.sha256(repr((
+        _file_digest(DIM_BIN),
+        _file_digest(os.path.join(SOURCE_DIR, "testty.py")),
+        OPEN_AND_QUIT, sorted(RUN_DIM_OPTIONS.items()),
+        [(arg, _file_digest(arg) if os.path.isfile(arg) else None) for arg in args],
+        rows, cols,
+    )).encode()).hexdigest()
+    path = os.path.join(PTY_CACHE_DIR, key + ".pickle")
+    try:
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        pass
+
+    result = run_dim(*args, keys=OPEN_AND_QUIT, rows=rows, cols=cols)
+    if result.did_exit and result.exit_code == 0:
+        # Write then rename, so parallel workers never read a partial file
+        os.makedirs(PTY_CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=PTY_CACHE_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f)
+        os.replace(tmp_path, path)
+    return result
+
+
+def make_scratch_dir(test):
+    """Create a temporary directory for files a test saves, removed after the test."""
+    path = tempfile.mkdtemp(prefix="dim-test-", dir=SCRATCH_ROOT)
+    test.addCleanup(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+
+class DimTestCase(unittest.TestCase):
+    """Base class for the dim tests, with assertions shared between them."""
+
+    def assertCleanExit(self, result, msg="Editor should have exited"):
+        """Assert that dim exited on its own with status 0."""
+        self.assertTrue(result.did_exit, msg)
+        self.assertEqual(result.exit_code, 0, f"Editor should exit with code 0, got {result.exit_code}")
+
+    def assertCasesInOneRun(self, filename, cases):
+        """Run several (name, keys, expected) cases in a single dim session.
+
+        Each case starts from a freshly reloaded file and ends once its
+        expected text is on screen, so one editor start covers them all.
+        Only the last case is left on the final screen, so the cases are
+        checked against the raw output as separate subtests.
+        """
+        reset = f":e {filename}[enter][wait:NORMAL]"
+        keys = "[wait:NORMAL]" + reset.join(
+            f"{case_keys}[wait:{expected}]" for _, case_keys, expected in cases)
+        result = run_dim(filename, keys=keys + "[ctrl-q]")
+        for name, case_keys, expected in cases:
+            with self.subTest(name=name):
+                self.assertIn(expected.encode(), result.raw,
+                    f"Expected {expected!r} after {case_keys}")
+        return result
+
+
+class TestDimQuit(DimTestCase):
     """Tests for quit functionality."""
 
     def test_cannot_quit_with_unsaved_changes(self):
         """Test that ctrl-q doesn't immediately quit when there are unsaved changes."""
         # Create a new file with some content, then try to quit without saving
-        input_str = "iHello, World![ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]iHello, World![ctrl-q]"
+
+        result = run_dim(keys=input_str)
 
         # Check that the warning message appears
         self.assertIn("WARNING", result.output, "Expected WARNING message when trying to quit with unsaved changes")
@@ -44,63 +217,39 @@ class TestDimQuit(unittest.TestCase):
     def test_quit_after_multiple_ctrl_q(self):
         """Test that pressing ctrl-q 4 times will quit even with unsaved changes."""
         # Create content and press ctrl-q 4 times (3 warnings + 1 to actually quit)
-        input_str = "iSome content[ctrl-q][ctrl-q][ctrl-q][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]iSome content[ctrl-q][ctrl-q][ctrl-q][ctrl-q]"
+
+        result = run_dim(keys=input_str)
 
         # After 4 ctrl-q presses, the editor SHOULD have exited
-        self.assertTrue(result.did_exit, "Editor should have exited after 4 Ctrl-Q presses with unsaved changes")
-        self.assertEqual(result.exit_code, 0, f"Editor should exit with code 0, got {result.exit_code}")
+        self.assertCleanExit(result, "Editor should have exited after 4 Ctrl-Q presses with unsaved changes")
 
     def test_quit_immediately_without_changes(self):
         """Test that :q quits immediately when there are no unsaved changes."""
         # Open an existing file and quit immediately without making changes
-        input_str = "[sleep:50]:q[enter]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "example.py"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]:q[enter]"
+
+        result = run_dim("example.py", keys=input_str)
 
         # Should not see warning message about unsaved changes
         self.assertNotIn("unsaved changes", result.output,
                         "Should not show warning when no changes were made")
 
-        # Should show the file content (snapshot taken before quit)
-        self.assertIn("example.py", result.output, "Should show the filename")
-        self.assertIn("python", result.output, "Should show python filetype")
+        # Should show the filename and python filetype on the status bar
+        # (snapshot taken before quit)
+        self.assertRegex(result.output, r"example\.py.*python",
+                         "Should show the filename and python filetype")
 
         # Should have exited immediately
-        self.assertTrue(result.did_exit, "Editor should have exited immediately without unsaved changes")
-        self.assertEqual(result.exit_code, 0, f"Editor should exit with code 0, got {result.exit_code}")
+        self.assertCleanExit(result, "Editor should have exited immediately without unsaved changes")
 
     def test_warning_countdown(self):
         """Test that the warning shows the correct countdown (3, 2, 1)."""
-        # Press ctrl-q once and check the countdown
-        input_str = "iContent[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        # Press ctrl-q once and wait for the warning before checking the countdown
+        input_str = "[wait:NORMAL]iContent[ctrl-q][wait:more times]"
+
+        # Only the message line is checked, so a short window is enough
+        result = run_dim(keys=input_str, rows=6)
 
         # First ctrl-q should show "Press Ctrl-Q 3 more times"
         # (quit_times starts at 3, shows message with current value)
@@ -108,23 +257,16 @@ class TestDimQuit(unittest.TestCase):
                      f"Expected '3 more times' in warning message")
 
 
-class TestDimSave(unittest.TestCase):
+class TestDimSave(DimTestCase):
     """Tests for save functionality."""
 
     def test_save_then_quit(self):
         """Test that saving changes allows immediate quit."""
         # Create a test file, make changes, save, then quit
-        input_str = "iTest content[ctrl-s]test_output.txt[enter][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]iTest content[ctrl-s]test_output.txt[enter][wait:written to disk][ctrl-q]"
+        scratch = make_scratch_dir(self)
+
+        result = run_dim(keys=input_str, cwd=scratch)
 
         # Should see "written to disk" message
         self.assertIn("written to disk", result.output, "Expected save confirmation message")
@@ -133,61 +275,37 @@ class TestDimSave(unittest.TestCase):
         self.assertNotIn("unsaved changes", result.output,
                         "Should not warn about unsaved changes after saving")
 
-        # Clean up the test file
-        if os.path.exists("test_output.txt"):
-            os.remove("test_output.txt")
-
     def test_save_new_file_creates_file(self):
         """Test that saving a new file with Ctrl-S creates the file on disk."""
-        # Type content, save as test_new_file.txt, then quit
-        input_str = "iNew file content[ctrl-s]test_new_file.txt[enter][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        # Type content, save as test_new_file.txt, then quit. dim saves
+        # before it reads the ctrl-q, so there is no need to wait for the
+        # confirmation to be drawn (test_save_then_quit checks that)
+        input_str = "[wait:NORMAL]iNew file content[ctrl-s]test_new_file.txt[enter][ctrl-q]"
+        scratch = make_scratch_dir(self)
+        path = os.path.join(scratch, "test_new_file.txt")
 
-        # Should see save confirmation
-        self.assertIn("written to disk", result.output, "Expected save confirmation message")
+        result = run_dim(keys=input_str, cwd=scratch)
 
         # File should exist on disk
-        self.assertTrue(os.path.exists("test_new_file.txt"), "Expected file to be created on disk")
+        self.assertTrue(os.path.exists(path), "Expected file to be created on disk")
 
         # Verify file contents
-        with open("test_new_file.txt", "r") as f:
+        with open(path, "rb") as f:
             contents = f.read()
-            self.assertIn("New file content", contents, "Expected file to contain typed content")
-
-        # Clean up
-        os.remove("test_new_file.txt")
+            self.assertIn(b"New file content", contents, "Expected file to contain typed content")
 
         # Should have exited cleanly
-        self.assertTrue(result.did_exit, "Editor should have exited")
-        self.assertEqual(result.exit_code, 0, f"Editor should exit with code 0, got {result.exit_code}")
+        self.assertCleanExit(result)
 
 
-class TestDimFileOperations(unittest.TestCase):
+class TestDimFileOperations(DimTestCase):
     """Tests for file opening and viewing."""
 
     def test_open_file_and_view_contents(self):
         """Test that dim can open a file and display its contents."""
         # Open hello_world.txt and wait briefly to let it render
-        input_str = "[sleep:50]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        # Six rows show the first four lines plus the status and message bars
+        result = open_file_snapshot("hello_world.txt", rows=6)
 
         # Check that file contents are visible
         self.assertIn("Hello, World!", result.output, "Expected to see 'Hello, World!' in file contents")
@@ -195,22 +313,12 @@ class TestDimFileOperations(unittest.TestCase):
         self.assertIn("Line 3: Testing line display", result.output, "Expected to see third line")
 
         # Should have exited cleanly
-        self.assertTrue(result.did_exit, "Editor should have exited")
-        self.assertEqual(result.exit_code, 0, f"Editor should exit with code 0, got {result.exit_code}")
+        self.assertCleanExit(result)
 
     def test_open_new_file_shows_no_name(self):
         """Test that opening dim without a file shows '[No Name]' in status bar."""
-        input_str = "[sleep:50]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        # Only the status bar is checked, so one text row is enough
+        result = open_file_snapshot(rows=3, cols=40)
 
         # Should show [No Name] in status bar
         self.assertIn("[No Name]", result.output, "Expected '[No Name]' in status bar for new file")
@@ -219,48 +327,27 @@ class TestDimFileOperations(unittest.TestCase):
     def test_open_readme_and_view_first_line(self):
         """Test that dim can open README.md and display its first line."""
         # Open README.md and wait briefly to let it render
-        input_str = "[sleep:50]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "README.md"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        result = open_file_snapshot("README.md", rows=6)
 
         # Check that the first line of README is visible
         self.assertIn("dim", result.output, "Expected to see 'dim' (first line of README)")
         self.assertIn("README.md", result.output, "Expected to see 'README.md' filename in status bar")
 
         # Should have exited cleanly
-        self.assertTrue(result.did_exit, "Editor should have exited")
-        self.assertEqual(result.exit_code, 0, f"Editor should exit with code 0, got {result.exit_code}")
+        self.assertCleanExit(result)
 
 
-class TestDimStatusBar(unittest.TestCase):
+class TestDimStatusBar(DimTestCase):
     """Tests for status bar functionality."""
 
     def test_status_bar_shows_filename_and_lines(self):
         """Test that the status bar displays filename, line count, and filetype."""
         # Open hello_world.txt
-        input_str = "[sleep:50]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        result = open_file_snapshot("hello_world.txt", rows=6)
 
         # Status bar should show filename and line count
-        self.assertIn("hello_world.txt", result.output, "Expected filename in status bar")
-        self.assertIn("5 lines", result.output, "Expected '5 lines' in status bar (file has 5 lines)")
+        self.assertRegex(result.output, r"hello_world\.txt.*5 lines",
+                         "Expected filename and '5 lines' in status bar (file has 5 lines)")
 
         # Should show "no ft" (no filetype) since .txt doesn't have syntax highlighting
         self.assertIn("no ft", result.output, "Expected 'no ft' for .txt file")
@@ -270,36 +357,18 @@ class TestDimStatusBar(unittest.TestCase):
 
     def test_status_bar_shows_python_filetype(self):
         """Test that the status bar shows 'python' filetype for .py files."""
-        input_str = "[sleep:50]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "example.py"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        result = open_file_snapshot("example.py")
 
-        # Should show filename and python filetype
-        self.assertIn("example.py", result.output, "Expected 'example.py' filename in status bar")
-        self.assertIn("python", result.output, "Expected 'python' filetype in status bar")
+        # Should show filename and python filetype on the same line
+        self.assertRegex(result.output, r"example\.py.*python",
+                         "Expected 'example.py' filename and 'python' filetype in status bar")
 
     def test_modified_indicator_in_status_bar(self):
         """Test that the status bar shows '(modified)' when file is edited."""
         # Open file, make a change, check for (modified) indicator
-        input_str = "[sleep:50]ix[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]ix[wait:(modified)][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str, rows=6)
 
         # After typing 'x', file should be marked as modified
         self.assertIn("(modified)", result.output,
@@ -309,23 +378,65 @@ class TestDimStatusBar(unittest.TestCase):
         self.assertIn("unsaved changes", result.output, "Expected warning about unsaved changes")
 
 
-class TestDimSyntaxHighlighting(unittest.TestCase):
+class HighlightSet:
+    """Colored sequences expected in raw output, checked in one regex pass.
+
+    Each entry is a (pattern, message) pair where pattern is a regex over the
+    raw bytes. The patterns become numbered groups of one alternation, so a
+    single scan finds which of them occur.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.regex = re.compile(b'|'.join(b'(' + pattern + b')' for pattern, _ in entries))
+
+    def missing(self, raw):
+        """Return the messages of entries that do not occur in raw."""
+        found = {match.lastindex for match in self.regex.finditer(raw)}
+        return [message for i, (_, message) in enumerate(self.entries, 1)
+                if i not in found]
+
+
+PYTHON_HIGHLIGHTS = HighlightSet([
+    (rb'\x1b\[33mdef\x1b\[37m',
+     "Expected keyword 'def' to be highlighted in yellow (33m -> 37m)"),
+    (rb'\x1b\[33mclass\x1b\[37m',
+     "Expected keyword 'class' to be highlighted in yellow (33m -> 37m)"),
+    (rb'\x1b\[35m"Hello, World!"',
+     "Expected string '\"Hello, World!\"' to be highlighted in magenta (35m)"),
+    (rb'\x1b\[36m"""',
+     "Expected docstring '\"\"\"' to be highlighted in cyan (36m)"),
+])
+
+C_HIGHLIGHTS = HighlightSet([
+    (rb'\x1b\[32mint\x1b\[37m',
+     "Expected type keyword 'int' to be highlighted in green (32m -> 37m)"),
+    (rb'\x1b\[33mif\x1b\[37m',
+     "Expected keyword 'if' to be highlighted in yellow (33m -> 37m)"),
+    (rb'\x1b\[33mreturn\x1b\[37m',
+     "Expected keyword 'return' to be highlighted in yellow (33m -> 37m)"),
+    (rb'\x1b\[35m"Hello from C!"\x1b\[37m',
+     "Expected string '\"Hello from C!\"' to be highlighted in magenta (35m -> 37m)"),
+    (rb'\x1b\[36m/\* Example C file',
+     "Expected comment '/* Example C file...' to be highlighted in cyan (36m)"),
+    (rb'\x1b\[31m[0-9]+\x1b\[37m',
+     "Expected numbers to be highlighted in red (31m -> 37m)"),
+])
+
+
+class TestDimSyntaxHighlighting(DimTestCase):
     """Tests for syntax highlighting."""
 
+    def assertHighlighted(self, raw, highlights):
+        """Assert that every sequence in highlights occurs in raw."""
+        missing = highlights.missing(raw)
+        if missing:
+            self.fail("\n".join(missing))
+
     def test_syntax_highlighting_python(self):
         """Test that Python syntax highlighting works for keywords, strings, and comments."""
         # Open example.py and wait for it to render
-        input_str = "[sleep:50]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "example.py"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        result = open_file_snapshot("example.py")
 
         # Check that Python content is visible
         self.assertIn("def hello_world", result.output, "Expected to see function definition")
@@ -339,37 +450,12 @@ class TestDimSyntaxHighlighting(unittest.TestCase):
         # Color code 33 = yellow (for keywords like def, class, if, return, etc.)
         # Color code 35 = magenta (for strings like "Hello, World!")
         # Color code 36 = cyan (for comments/docstrings like """...""")
-        raw_str = result.raw.decode('utf-8', errors='ignore')
-
-        # Check that specific keywords are highlighted in yellow (33m) followed by reset to white (37m)
-        self.assertIn("\x1b[33mdef\x1b[37m", raw_str,
-                     "Expected keyword 'def' to be highlighted in yellow (33m -> 37m)")
-        self.assertIn("\x1b[33mclass\x1b[37m", raw_str,
-                     "Expected keyword 'class' to be highlighted in yellow (33m -> 37m)")
-
-        # Check that strings are highlighted in magenta (35m)
-        # The string content should start with the color code
-        self.assertIn('\x1b[35m"Hello, World!"', raw_str,
-                     "Expected string '\"Hello, World!\"' to be highlighted in magenta (35m)")
-
-        # Check that docstrings/comments are highlighted in cyan (36m)
-        self.assertIn('\x1b[36m"""', raw_str,
-                     "Expected docstring '\"\"\"' to be highlighted in cyan (36m)")
+        self.assertHighlighted(result.raw, PYTHON_HIGHLIGHTS)
 
     def test_syntax_highlighting_c(self):
         """Test that C syntax highlighting works with color codes."""
         # Open example.c and wait for it to render
-        input_str = "[sleep:50]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "example.c"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        result = open_file_snapshot("example.c")
 
         # Check that C content is visible
         self.assertIn("int main", result.output, "Expected to see main function")
@@ -381,77 +467,36 @@ class TestDimSyntaxHighlighting(unittest.TestCase):
         self.assertIn("c", result.output.lower(), "Expected 'c' filetype in status bar")
 
         # Check for explicit highlighted sequences in raw output
-        # Color code 33 = yellow (for keywords like int, if, return, etc.)
-        # Color code 35 = magenta (for strings like "Hello from C!")
-        # Color code 36 = cyan (for comments /* ... */)
-        raw_str = result.raw.decode('utf-8', errors='ignore')
-
-        # Check that specific keywords are highlighted
         # Type keywords like 'int' are green (32m), regular keywords are yellow (33m)
-        self.assertIn("\x1b[32mint\x1b[37m", raw_str,
-                     "Expected type keyword 'int' to be highlighted in green (32m -> 37m)")
-        self.assertIn("\x1b[33mif\x1b[37m", raw_str,
-                     "Expected keyword 'if' to be highlighted in yellow (33m -> 37m)")
-        self.assertIn("\x1b[33mreturn\x1b[37m", raw_str,
-                     "Expected keyword 'return' to be highlighted in yellow (33m -> 37m)")
-
-        # Check that strings are highlighted in magenta (35m) followed by white (37m)
-        self.assertIn('\x1b[35m"Hello from C!"\x1b[37m', raw_str,
-                     "Expected string '\"Hello from C!\"' to be highlighted in magenta (35m -> 37m)")
-
-        # Check that comments are highlighted in cyan (36m)
-        self.assertIn('\x1b[36m/* Example C file', raw_str,
-                     "Expected comment '/* Example C file...' to be highlighted in cyan (36m)")
-
-        # Also check number highlighting (31m = red)
-        self.assertTrue(
-            "\x1b[31m0\x1b[37m" in raw_str or
-            "\x1b[31m1\x1b[37m" in raw_str or
-            "\x1b[31m42\x1b[37m" in raw_str,
-            "Expected numbers to be highlighted in red (31m -> 37m)"
-        )
+        # Color code 35 = magenta (for strings like "Hello from C!")
+        # Color code 36 = cyan (for comments /* ... */), 31 = red (for numbers)
+        self.assertHighlighted(result.raw, C_HIGHLIGHTS)
 
 
-class TestDimNavigation(unittest.TestCase):
+class TestDimNavigation(DimTestCase):
     """Tests for navigation functionality."""
 
     def test_navigation_with_arrow_keys(self):
         """Test that arrow keys navigate through the file."""
         # Open hello_world.txt, press down arrow 3 times, then quit
         # This should move cursor to line 4
-        input_str = "[sleep:50]i[down][down][down][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]i[down][down][down][wait:4/5][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # After pressing down 3 times, we should be on line 4 (started at line 1)
         self.assertIn("4/5", result.output, "Expected cursor at line 4/5 after 3 down arrows")
 
 
-class TestDimYankPaste(unittest.TestCase):
+class TestDimYankPaste(DimTestCase):
     """Tests for yank (yy) and paste (p) functionality."""
 
     def test_yank_line_and_paste(self):
         """Test that yy yanks current line and p pastes it below."""
         # Open hello_world.txt, yank first line with yy, move down, paste with p
-        input_str = "[sleep:50]yyjp[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]yyjp[wait:(modified)][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # After yanking line 1 "Hello, World!" and pasting after line 2,
         # we should see "Hello, World!" appear twice in the output
@@ -463,17 +508,9 @@ class TestDimYankPaste(unittest.TestCase):
     def test_yank_line_shows_message(self):
         """Test that yy shows a 'yanked' message in status bar."""
         # Open file and yank a line
-        input_str = "[sleep:50]yy[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]yy[wait:Yanked][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Should show confirmation that line was yanked
         self.assertIn("yank", result.output.lower(),
@@ -482,133 +519,76 @@ class TestDimYankPaste(unittest.TestCase):
     def test_paste_without_yank(self):
         """Test that p does nothing or shows message when nothing is yanked."""
         # Open file and try to paste without yanking first
-        input_str = "[sleep:50]p[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]p[ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # File should remain unchanged (still 5 lines)
         self.assertIn("5 lines", result.output,
             "Expected file to still have 5 lines when paste with empty register")
 
 
-class TestDimTabInsertion(unittest.TestCase):
+class TestDimTabInsertion(DimTestCase):
     """Tests for tab key insertion behavior."""
 
     def test_tab_inserts_four_spaces(self):
-        """Test that pressing tab in insert mode inserts 4 spaces."""
-        # Create new file, enter insert mode, press tab, then type text
-        input_str = "[sleep:50]i[tab]test[ctrl-s]test_tab.txt[enter][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        """Test that each tab pressed in insert mode inserts 4 spaces."""
+        # Create new file, type one line after a tab and one after two tabs,
+        # then save both with a single dim run
+        input_str = "[wait:NORMAL]i[tab]test[enter][tab][tab]indented[ctrl-s]test_tab.txt[enter][ctrl-q]"
+        scratch = make_scratch_dir(self)
+        path = os.path.join(scratch, "test_tab.txt")
+
+        result = run_dim(keys=input_str, cwd=scratch)
 
         # Verify file was created with 4 spaces before 'test'
-        self.assertTrue(os.path.exists("test_tab.txt"),
+        self.assertTrue(os.path.exists(path),
             "Expected file to be created")
 
-        with open("test_tab.txt", "r") as f:
+        with open(path, "rb") as f:
             contents = f.read()
-            # Tab should insert 4 spaces, not a tab character
-            self.assertIn("    test", contents,
-                "Expected 4 spaces before 'test' when tab is pressed")
-            self.assertNotIn("\t", contents,
-                "Expected spaces, not tab character")
-
-        # Clean up
-        os.remove("test_tab.txt")
+        lines = contents.split(b'\n')
+        # Tab should insert 4 spaces, not a tab character
+        self.assertEqual(lines[0], b"    test",
+            "Expected 4 spaces before 'test' when tab is pressed")
+        # Two tabs at the beginning of a line should give 8 spaces
+        self.assertEqual(lines[1], b"        indented",
+            "Expected 8 spaces (2 tabs) before 'indented'")
+        self.assertNotIn(b"\t", contents,
+            "Expected spaces, not tab character")
 
     def test_tab_respects_existing_tabs(self):
         """Test that tab inserts actual tabs if file already contains tabs."""
         # Create a file with tabs first
-        with open("test_with_tabs.txt", "w") as f:
+        scratch = make_scratch_dir(self)
+        path = os.path.join(scratch, "test_with_tabs.txt")
+        with open(path, "w") as f:
             f.write("\tindented with tab\n")
 
         # Open the file, go to end, add new line with tab
-        input_str = "[sleep:50]Go[tab]more[ctrl-s][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "test_with_tabs.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]Go[tab]more[ctrl-s][ctrl-q]"
+
+        result = run_dim("test_with_tabs.txt", keys=input_str, cwd=scratch)
 
         # Read the file and check if tab was used
-        with open("test_with_tabs.txt", "r") as f:
+        with open(path, "rb") as f:
             contents = f.read()
-            lines = contents.split('\n')
+            lines = contents.split(b'\n')
             # The new line should also use tab (if feature respects existing tabs)
             if len(lines) >= 2:
-                self.assertIn("\t", lines[-1] if lines[-1] else lines[-2],
+                self.assertIn(b"\t", lines[-1] if lines[-1] else lines[-2],
                     "Expected tab character when file already contains tabs")
 
-        # Clean up
-        os.remove("test_with_tabs.txt")
-
-    def test_tab_at_beginning_of_line(self):
-        """Test that tab at beginning of line creates proper indentation."""
-        # Create new file, enter insert mode, press tab twice
-        input_str = "[sleep:50]i[tab][tab]indented[ctrl-s]test_indent.txt[enter][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
-
-        # Verify file was created with 8 spaces (2 tabs * 4 spaces each)
-        self.assertTrue(os.path.exists("test_indent.txt"),
-            "Expected file to be created")
-
-        with open("test_indent.txt", "r") as f:
-            contents = f.read()
-            # Two tabs should give 8 spaces
-            self.assertIn("        indented", contents,
-                "Expected 8 spaces (2 tabs) before 'indented'")
-
-        # Clean up
-        os.remove("test_indent.txt")
-
 
-class TestDimJJEscape(unittest.TestCase):
+class TestDimJJEscape(DimTestCase):
     """Tests for jj to escape from insert mode."""
 
     def test_jj_escapes_insert_mode(self):
         """Test that typing jj quickly in insert mode escapes to normal mode."""
         # Enter insert mode, type some text, then jj to escape, then :q to quit
-        input_str = "[sleep:50]ihello jj[sleep:10]:q[enter]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]ihello jj[sleep:10]:q[enter]"
+
+        result = run_dim(keys=input_str)
 
         # If jj worked, we should see "hello " (without jj) in the content
         # and the :q command should have worked (process should exit or show command)
@@ -625,20 +605,13 @@ class TestDimJJEscape(unittest.TestCase):
         self.assertTrue(command_worked,
             "Expected jj to escape insert mode and :q to be interpreted as command")
 
+    @slow_test
     def test_jj_does_not_escape_when_slow(self):
         """Test that j followed by slow j does not escape insert mode."""
         # Enter insert mode, type j, wait, type j - should insert both j's
-        input_str = "[sleep:50]ij[sleep:200]j[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]ij[sleep:200]j[sleep:20][ctrl-q]"
+
+        result = run_dim(keys=input_str)
 
         # Both j's should appear in the content since they were typed slowly
         self.assertIn("jj", result.output,
@@ -650,17 +623,9 @@ class TestDimJJEscape(unittest.TestCase):
     def test_jj_in_middle_of_text(self):
         """Test that jj works even when typed in the middle of text."""
         # Type some text, then jj, then more commands
-        input_str = "[sleep:50]itestjj:q[enter]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]itestjj:q[enter]"
+
+        result = run_dim(keys=input_str)
 
         # Should see "test" but not "jj" in content (jj triggered escape)
         self.assertIn("test", result.output,
@@ -674,23 +639,15 @@ class TestDimJJEscape(unittest.TestCase):
             "Expected jj to escape and :q to work as command")
 
 
-class TestDimNumberRepeat(unittest.TestCase):
+class TestDimNumberRepeat(DimTestCase):
     """Tests for number prefix to repeat commands."""
 
     def test_number_j_moves_down_multiple_lines(self):
         """Test that 3j moves cursor down 3 lines."""
         # Open file with 5 lines, press 3j to move down 3 lines
-        input_str = "[sleep:50]3j[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]3j[wait:4/5][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Should be on line 4 (started at line 1, moved down 3)
         self.assertIn("4/5", result.output,
@@ -699,17 +656,9 @@ class TestDimNumberRepeat(unittest.TestCase):
     def test_number_k_moves_up_multiple_lines(self):
         """Test that 2k moves cursor up 2 lines."""
         # Open file, go to line 5, then press 2k to move up 2 lines
-        input_str = "[sleep:50]G2k[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]G2k[wait:3/5][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Started at line 5 (G), moved up 2, should be at line 3
         self.assertIn("3/5", result.output,
@@ -718,17 +667,9 @@ class TestDimNumberRepeat(unittest.TestCase):
     def test_number_x_deletes_multiple_chars(self):
         """Test that 5x deletes 5 characters."""
         # Open file, delete 5 characters with 5x
-        input_str = "[sleep:50]5x[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]5x[wait:(modified)][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # "Hello, World!" should become ", World!" after deleting "Hello"
         self.assertIn(", World!", result.output,
@@ -740,17 +681,9 @@ class TestDimNumberRepeat(unittest.TestCase):
     def test_number_dd_deletes_multiple_lines(self):
         """Test that 2dd deletes 2 lines."""
         # Open file, delete 2 lines with 2dd
-        input_str = "[sleep:50]2dd[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]2dd[wait:3 lines][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # After deleting first 2 lines, should have 3 lines remaining
         self.assertIn("3 lines", result.output,
@@ -762,80 +695,35 @@ class TestDimNumberRepeat(unittest.TestCase):
     def test_large_number_repeat(self):
         """Test that large numbers like 10j work correctly."""
         # Open file, try to move down 10 lines (should stop at end)
-        input_str = "[sleep:50]10j[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]10j[wait:5/5][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Should be at the last line (5/5) since file only has 5 lines
         self.assertIn("5/5", result.output,
             "Expected cursor at line 5/5 after 10j (capped at file end)")
 
 
-class TestDimFindCharacter(unittest.TestCase):
+class TestDimFindCharacter(DimTestCase):
     """Tests for f (find character) and related motions."""
 
-    def test_f_jumps_to_character(self):
-        """Test that f{char} moves cursor to next occurrence of character."""
-        # Open file, use fw to jump to 'W' in "Hello, World!"
-        input_str = "[sleep:50]fW[sleep:20]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
-
-        # After f jumps to W, entering insert mode and trying to quit
-        # should show unsaved changes (cursor moved to position 7 for 'W')
-        # The presence of the file content indicates we're still in the editor
-        self.assertIn("Hello, World!", result.output,
-            "Expected file content to be visible")
-
-    def test_f_with_number_prefix(self):
-        """Test that 2f{char} jumps to second occurrence of character."""
-        # Line is "Hello, World!" - 2fl should jump to second 'l'
-        input_str = "[sleep:50]2fl[sleep:20]i[ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
-
-        # Should have moved to second 'l' in "Hello"
-        self.assertIn("Hello, World!", result.output,
-            "Expected file content after 2fl")
+    def test_f_motions(self):
+        """Test f{char}, count-prefixed f and f with no match."""
+        # Line is "Hello, World!"; x/r after the motion show where it landed
+        self.assertCasesInOneRun("hello_world.txt", [
+            ("jumps_to_character", "fWx", "Hello, orld!"),
+            # 2fl skips the first 'l' and lands on the second
+            ("number_prefix", "2flx", "Helo, World!"),
+            # No 'z' on the line, so the cursor stays on 'H'
+            ("no_match_does_nothing", "fzrZ", "Zello, World!"),
+        ])
 
     def test_ct_change_to_character(self):
         """Test that ct{char} deletes to character and enters insert mode."""
         # On "Hello, World!" use ct, to change to comma, then type "Goodbye"
-        input_str = "[sleep:50]ct,Goodbye[esc][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]ct,Goodbye[esc][wait:NORMAL][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # "Hello" should be replaced with "Goodbye", leaving "Goodbye, World!"
         self.assertIn("Goodbye", result.output,
@@ -848,17 +736,9 @@ class TestDimFindCharacter(unittest.TestCase):
     def test_dt_delete_to_character(self):
         """Test that dt{char} deletes to character (not including it)."""
         # On "Hello, World!" use dt, to delete to comma
-        input_str = "[sleep:50]dt,[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]dt,[wait:(modified)][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # "Hello" should be deleted, leaving ", World!"
         self.assertIn(", World!", result.output,
@@ -866,46 +746,16 @@ class TestDimFindCharacter(unittest.TestCase):
         self.assertIn("(modified)", result.output,
             "Expected (modified) after deletion")
 
-    def test_f_no_match_does_nothing(self):
-        """Test that f{char} with no match leaves cursor in place."""
-        # Try to find 'z' which doesn't exist in "Hello, World!"
-        input_str = "[sleep:50]fz[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
-
-        # Cursor should still be at line 1 (no modification, no movement indicated)
-        self.assertIn("1/5", result.output,
-            "Expected cursor to remain at line 1/5 when f finds no match")
-        # File should not be modified
-        self.assertNotIn("(modified)", result.output,
-            "Expected no modification when f finds no match")
-
 
-class TestDimEditCommand(unittest.TestCase):
+class TestDimEditCommand(DimTestCase):
     """Tests for :e (edit) command with tab completion."""
 
     def test_edit_command_tab_completion(self):
         """Test that :e file<tab> tab-completes filenames."""
         # Open dim, type :e hell<tab> which should complete to hello_world.txt
-        input_str = "[sleep:50]:e hell[tab][sleep:50][enter][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]:e hell[tab][wait:hello_world.txt][enter][wait:Hello, World!][ctrl-q]"
+
+        result = run_dim(keys=input_str)
 
         # After tab completion and opening, should see hello_world.txt in status
         self.assertIn("hello_world.txt", result.output,
@@ -914,17 +764,9 @@ class TestDimEditCommand(unittest.TestCase):
     def test_edit_command_opens_file(self):
         """Test that :e filename opens the specified file."""
         # Open dim, use :e to open hello_world.txt
-        input_str = "[sleep:50]:e hello_world.txt[enter][sleep:50][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]:e hello_world.txt[enter][wait:Hello, World!][ctrl-q]"
+
+        result = run_dim(keys=input_str)
 
         # Should see file contents and filename in status bar
         self.assertIn("hello_world.txt", result.output,
@@ -935,17 +777,9 @@ class TestDimEditCommand(unittest.TestCase):
     def test_edit_command_relative_path(self):
         """Test that :e works with relative paths based on current buffer."""
         # First open example.py, then use :e to open example.c (same directory)
-        input_str = "[sleep:50]:e example.c[enter][sleep:50][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "example.py"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]:e example.c[enter][wait:int main][ctrl-q]"
+
+        result = run_dim("example.py", keys=input_str)
 
         # Should now show example.c content
         self.assertIn("example.c", result.output,
@@ -956,17 +790,9 @@ class TestDimEditCommand(unittest.TestCase):
     def test_edit_command_shows_completion_options(self):
         """Test that tab shows multiple options when prefix matches multiple files."""
         # Type :e example<tab> which matches both example.py and example.c
-        input_str = "[sleep:50]:e example[tab][sleep:50][esc][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]:e example[tab][wait:example.][esc][ctrl-q]"
+
+        result = run_dim(keys=input_str)
 
         # Should show both options or complete to common prefix
         # Either "example." is shown or both files are listed
@@ -979,23 +805,15 @@ class TestDimEditCommand(unittest.TestCase):
             "Expected tab completion to show example files")
 
 
-class TestDimYankWord(unittest.TestCase):
+class TestDimYankWord(DimTestCase):
     """Tests for yw (yank word) functionality."""
 
     def test_yank_word_and_paste(self):
         """Test that yw yanks current word and p pastes it."""
         # Open hello_world.txt, yank first word with yw, move to end of line, paste
-        input_str = "[sleep:50]yw$p[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]yw$p[wait:(modified)][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # After yanking "Hello," (first word) and pasting at end,
         # we should see "Hello" appear twice on the first line
@@ -1006,17 +824,9 @@ class TestDimYankWord(unittest.TestCase):
     def test_yank_word_shows_message(self):
         """Test that yw shows a 'yanked' message in status bar."""
         # Open file and yank a word
-        input_str = "[sleep:50]yw[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]yw[wait:Yanked][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Should show confirmation that word was yanked
         self.assertIn("yank", result.output.lower(),
@@ -1025,40 +835,24 @@ class TestDimYankWord(unittest.TestCase):
     def test_yank_word_and_paste_at_different_location(self):
         """Test yanking word on one line and pasting on another."""
         # Yank "Hello," then go to line 2 and paste
-        input_str = "[sleep:50]ywjp[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]ywjp[wait:(modified)][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # File should be modified after paste
         self.assertIn("(modified)", result.output,
             "Expected (modified) after pasting yanked word")
 
 
-class TestDimCapitalC(unittest.TestCase):
+class TestDimCapitalC(DimTestCase):
     """Tests for C (change to end of line) functionality."""
 
     def test_C_deletes_to_end_of_line_and_enters_insert(self):
         """Test that C deletes from cursor to end of line and enters insert mode."""
         # Open file, move right 5 chars to 'o' in "Hello", then C to delete rest
-        input_str = "[sleep:50]foCReplaced[esc][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]foCReplaced[esc][wait:NORMAL][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # After fo (find 'o'), C should delete ", World!" and we type "Replaced"
         # Result should be "HelloReplaced"
@@ -1070,17 +864,9 @@ class TestDimCapitalC(unittest.TestCase):
     def test_C_at_end_of_line_enters_insert_mode(self):
         """Test that C at end of line just enters insert mode."""
         # Go to end of line with $, then C, type text
-        input_str = "[sleep:50]$CExtra[esc][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]$CExtra[esc][wait:NORMAL][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Should see Extra appended
         self.assertIn("Extra", result.output,
@@ -1089,103 +875,39 @@ class TestDimCapitalC(unittest.TestCase):
     def test_C_shows_insert_mode(self):
         """Test that C enters INSERT mode."""
         # Use C and check mode indicator
-        input_str = "[sleep:50]C[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]C[wait:INSERT][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Should be in INSERT mode
         self.assertIn("INSERT", result.output,
             "Expected INSERT mode after C")
 
 
-class TestDimReplaceChar(unittest.TestCase):
+class TestDimReplaceChar(DimTestCase):
     """Tests for r (replace character) functionality."""
 
-    def test_r_replaces_character(self):
-        """Test that r{char} replaces current character with new character."""
-        # Open file, replace 'H' with 'J'
-        input_str = "[sleep:50]rJ[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
-
-        # First character 'H' should be replaced with 'J'
-        self.assertIn("Jello, World!", result.output,
-            "Expected 'Jello, World!' after replacing H with J")
+    def test_r_replace_character(self):
+        """Test r{char}, that r stays in normal mode, and count-prefixed r."""
+        result = self.assertCasesInOneRun("hello_world.txt", [
+            ("replaces_character", "rJ", "Jello, World!"),
+            # l moves and x deletes rather than being typed into the line
+            ("stays_in_normal_mode", "rJlx", "Jllo, World!"),
+            ("number_prefix", "3rX", "XXXlo, World!"),
+        ])
         self.assertIn("(modified)", result.output,
             "Expected (modified) after replacement")
 
-    def test_r_stays_in_normal_mode(self):
-        """Test that r remains in normal mode after replacement."""
-        # Replace character, then try a normal mode command
-        input_str = "[sleep:50]rJl[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
-
-        # Should still be in NORMAL mode (l moved right, not inserted 'l')
-        self.assertIn("NORMAL", result.output,
-            "Expected NORMAL mode after r replacement")
-
-    def test_r_with_number_prefix(self):
-        """Test that 3r{char} replaces 3 characters."""
-        # Replace first 3 characters with 'X'
-        input_str = "[sleep:50]3rX[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
-
-        # First 3 chars "Hel" should be replaced with "XXX"
-        self.assertIn("XXXlo, World!", result.output,
-            "Expected 'XXXlo, World!' after 3rX")
 
-
-class TestDimBackwardFind(unittest.TestCase):
+class TestDimBackwardFind(DimTestCase):
     """Tests for F and T (backward find character) functionality."""
 
     def test_F_jumps_backward_to_character(self):
         """Test that F{char} moves cursor backward to character."""
         # Go to end of line, then F, to find the comma backward
-        input_str = "[sleep:50]$F,[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]$F,[ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Cursor should be on ',' now, file unmodified
         self.assertNotIn("(modified)", result.output,
@@ -1196,17 +918,9 @@ class TestDimBackwardFind(unittest.TestCase):
     def test_T_jumps_backward_before_character(self):
         """Test that T{char} moves cursor backward to one after character."""
         # Go to end of line, then T, to find position after comma backward
-        input_str = "[sleep:50]$T,[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]$T,[ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # File should not be modified
         self.assertNotIn("(modified)", result.output,
@@ -1215,17 +929,9 @@ class TestDimBackwardFind(unittest.TestCase):
     def test_dF_deletes_backward_to_character(self):
         """Test that dF{char} deletes backward to character (inclusive)."""
         # Go to end of line, then dF, to delete from cursor back to comma
-        input_str = "[sleep:50]$dF,[sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]$dF,[wait:(modified)][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # "Hello, World!" with $dF, should become "Hello"
         # (delete from end back to and including comma)
@@ -1237,17 +943,9 @@ class TestDimBackwardFind(unittest.TestCase):
     def test_cT_changes_backward_before_character(self):
         """Test that cT{char} changes backward to one after character."""
         # Go to end of line, then cT, to change from cursor to after comma
-        input_str = "[sleep:50]$cT,NEW[esc][sleep:20][ctrl-q]"
-        input_tokens = parse_input_string(input_str)
-
-        result = run_with_pty(
-            command=["./dim", "hello_world.txt"],
-            input_tokens=input_tokens,
-            delay_ms=10,
-            timeout=0.5,
-            rows=24,
-            cols=80
-        )
+        input_str = "[wait:NORMAL]$cT,NEW[esc][wait:NORMAL][ctrl-q]"
+
+        result = run_dim("hello_world.txt", keys=input_str)
 
         # Should see NEW in the output
         self.assertIn("NEW", result.output,
@@ -1256,5 +954,99 @@ class TestDimBackwardFind(unittest.TestCase):
             "File should be modified after change")
 
 
+def _test_ids(suite):
+    """Yield the id of every test in a (possibly nested) suite."""
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _test_ids(test)
+        else:
+            yield test.id()
+
+
+def _run_one(test_id):
+    """Run a single test and return (test_id, outcome, list of tracebacks, stdout)."""
+    result = unittest.TestResult()
+    out = io.StringIO()
+    # Hold anything the test prints so workers don't interleave their output
+    with contextlib.redirect_stdout(out):
+        unittest.defaultTestLoader.loadTestsFromName(test_id).run(result)
+    if result.errors:
+        outcome = "ERROR"
+    elif result.failures:
+        outcome = "FAIL"
+    elif result.skipped:
+        outcome = "skipped"
+    else:
+        outcome = "ok"
+    return test_id, outcome, [tb for _, tb in result.errors + result.failures], out.getvalue()
+
+
+def matches_patterns(test_id, patterns):
+    """Return True if test_id matches any pattern, as unittest's -k does.
+
+    A pattern without wildcards matches any test id containing it.
+    """
+    return any(fnmatch.fnmatchcase(test_id, p if '*' in p else f'*{p}*')
+               for p in patterns)
+
+
+def run_parallel(max_workers=None, patterns=()):
+    """Run the tests in this module in parallel, one dim process per test.
+
+    Each test spawns its own PTY and mostly sleeps waiting on it, so they run
+    concurrently in forked workers, several per CPU. If patterns are given,
+    only the tests matching one of them are run. Results, and anything the
+    tests printed, are reported in the order unittest loads the tests.
+    Returns True if every test passed.
+    """
+    # Build before forking so workers never race on make
+    ensure_dim_built()
+
+    suite = unittest.defaultTestLoader.loadTestsFromModule(sys.modules[__name__])
+    test_ids = [test_id for test_id in _test_ids(suite)
+                if not patterns or matches_patterns(test_id, patterns)]
+    if max_workers is None:
+        max_workers = max(1, min(len(test_ids), 4 * (os.cpu_count() or 1)))
+
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=multiprocessing.get_context('fork')) as ex:
+        results = list(ex.map(_run_one, test_ids))
+    elapsed = time.time() - start
+
+    sys.stdout.write(''.join(out for _, _, _, out in results))
+    sys.stdout.flush()
+
+    # Build the report and write it at once
+    report = []
+    problems = []
+    for test_id, outcome, tracebacks, _ in results:
+        report.append(f"{test_id} ... {outcome}")
+        problems.extend((outcome, test_id, tb) for tb in tracebacks)
+    for outcome, test_id, tb in problems:
+        report += ["=" * 70, f"{outcome}: {test_id}", "-" * 70, tb]
+
+    report += ["-" * 70, f"Ran {len(results)} tests in {elapsed:.3f}s\n"]
+    failed = sum(1 for _, outcome, _, _ in results if outcome in ("FAIL", "ERROR"))
+    skipped = sum(1 for _, outcome, _, _ in results if outcome == "skipped")
+    if failed:
+        report.append(f"FAILED (failures={failed})")
+    else:
+        report.append(f"OK (skipped={skipped})" if skipped else "OK")
+    sys.stderr.write('\n'.join(report) + '\n')
+    return not failed
+
+
 if __name__ == "__main__":
-    unittest.main()
+    # "-k PATTERN" options select tests and still run them in parallel,
+    # e.g. `python3 test_dim.py -k Syntax -k Save`
+    args = sys.argv[1:]
+    patterns = []
+    while len(args) >= 2 and args[0] == "-k":
+        patterns.append(args[1])
+        args = args[2:]
+    if args:
+        # Running selected tests or passing other unittest options
+        unittest.main()
+    else:
+        sys.exit(0 if run_parallel(patterns=patterns) else 1)
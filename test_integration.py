@@ -17,10 +17,6 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 class TestUserSession1(unittest.TestCase):
     """Integration test from user-session-1 recording."""
 
-    def setUp(self):
-        """Ensure we're in the right directory."""
-        os.chdir(SCRIPT_DIR)
-
     def test_user_session_1(self):
         """
         Replay user-session-1 which tests:
@@ -33,23 +29,28 @@ class TestUserSession1(unittest.TestCase):
         """
         session_dir = os.path.join(SCRIPT_DIR, "user-session-1")
 
-        # The recorded input sequence (minimal sleeps only before screen checks)
+        # The recorded input sequence (EXPECT_SCREEN waits for output to settle),
+        # starting once dim is in raw mode so no keys are flushed
         input_sequence = (
-            "wcwTest[esc]0"
-            "[enter][sleep:50][EXPECT_SCREEN:snapshot001.txt]jyyp"
-            "[enter][sleep:50][EXPECT_SCREEN:snapshot002.txt]jj$"
+            "[wait:NORMAL]wcwTest[esc]0"
+            "[enter][EXPECT_SCREEN:snapshot001.txt]jyyp"
+            "[enter][EXPECT_SCREEN:snapshot002.txt]jj$"
             "%a a kjA hellojj"
             "k0wdwcool[backspace][backspace]"
             "[backspace]jjkkk$"
             "a a i this is a test"
-            "[enter][sleep:50][EXPECT_SCREEN:snapshot003.txt][esc]k"
+            "[enter][EXPECT_SCREEN:snapshot003.txt][esc]k"
             ":q![enter]"
         )
 
+        # testty changes into SCRIPT_DIR itself. Without cwd= and with
+        # close_fds=False (our fds are non-inheritable anyway), subprocess
+        # can start it with posix_spawn instead of fork+exec.
         result = subprocess.run(
             [
-                sys.executable, "testty.py",
+                sys.executable, os.path.join(SCRIPT_DIR, "testty.py"),
                 "--run", "./dim example.c",
+                "--cwd", SCRIPT_DIR,
                 "--rows", "49",
                 "--cols", "161",
                 "--input", input_sequence,
@@ -57,16 +58,15 @@ class TestUserSession1(unittest.TestCase):
                 "--timeout", "10.0"
             ],
             capture_output=True,
-            text=True,
-            cwd=SCRIPT_DIR
+            close_fds=False
         )
 
-        # Check for success
+        # Check for success; the output is only decoded to report a failure
         if result.returncode != 0:
             self.fail(
                 f"Integration test failed with exit code {result.returncode}\n"
-                f"stderr: {result.stderr}\n"
-                f"stdout: {result.stdout}"
+                f"stderr: {result.stderr.decode('utf-8', errors='replace')}\n"
+                f"stdout: {result.stdout.decode('utf-8', errors='replace')}"
             )
 
 
@@ -4,13 +4,21 @@ Unit tests for savetty.py and EXPECT_SCREEN functionality in testty.py
 """
 
 import os
+import queue
 import sys
+import time
 import unittest
 import tempfile
 import shutil
+import subprocess
 
 sys.path.insert(0, os.path.dirname(__file__))
-from testty import run_with_pty, parse_input_string, ScreenExpectation
+from savetty import (apply_resize, byte_to_sequence, copy_screen,
+                     is_terminal_response, process_input_bytes, save_snapshot,
+                     snapshot_writer)
+from testty import (run_with_pty, parse_input_string, ScreenExpectation,
+                    ScreenExpectationError, TerminalScreen, batch_keys,
+                    is_printable_key, load_snapshot)
 
 
 class TestExpectScreenParsing(unittest.TestCase):
@@ -38,21 +46,104 @@ class TestExpectScreenParsing(unittest.TestCase):
         self.assertEqual(tokens1, tokens2)
 
 
+class TestWaitToken(unittest.TestCase):
+    """Tests for the [wait:TEXT] token."""
+
+    def test_parse_wait_token_keeps_case(self):
+        """Test that the wait text is kept exactly as written."""
+        tokens = parse_input_string("[wait:Hello World]x")
+        self.assertEqual(tokens, [('wait', 'Hello World'), b'x'])
+
+    def test_wait_returns_when_text_appears(self):
+        """Test that waiting stops as soon as the text is on screen."""
+        start = time.time()
+        result = run_with_pty(
+            command=["sh", "-c", "sleep 0.1; echo ready; sleep 2"],
+            input_tokens=parse_input_string("[wait:ready]x"),
+            timeout=1.0,
+        )
+        self.assertIn("ready", result.output)
+        # Well short of the 1s wait timeout
+        self.assertLess(time.time() - start, 0.8)
+
+
+class TestKeyBatching(unittest.TestCase):
+    """Tests for sending keys without a delay between them."""
+
+    def test_batch_keys_groups_runs(self):
+        """Test that runs of keys are grouped, leaving the last token alone."""
+        tokens = parse_input_string("ab[sleep:5]cd[ctrl-q]")
+        self.assertEqual(batch_keys(tokens),
+                         [[b'a', b'b'], ('sleep', 5), [b'c', b'd'], b'\x11'])
+
+    def test_batch_printable_keys_only(self):
+        """Test that control keys are kept apart when only typed text is batched."""
+        tokens = parse_input_string("ab[esc]c[enter]de[ctrl-q]")
+        self.assertEqual(batch_keys(tokens, is_printable_key),
+                         [[b'a', b'b'], b'\x1b', [b'c'], b'\r', [b'd', b'e'], b'\x11'])
+
+    def test_zero_delay_sends_every_key(self):
+        """Test that batched keys all reach the program."""
+        result = run_with_pty(
+            command=["cat"],
+            input_tokens=parse_input_string("hello[enter]world[enter]"),
+            delay_ms=0,
+            timeout=0.5,
+        )
+        # Each line appears twice: the terminal's echo and cat's copy
+        self.assertEqual(result.output.count("hello"), 2)
+        self.assertEqual(result.output.count("world"), 2)
+
+    def test_zero_delay_sends_long_runs_of_keys(self):
+        """Test that runs longer than IOV_MAX keys, or the PTY buffer, arrive whole."""
+        result = run_with_pty(
+            command=["cat"],
+            input_tokens=parse_input_string("x" * 1100 + "[enter]"),
+            delay_ms=0,
+            timeout=1.0,
+        )
+        # The terminal's echo and cat's copy
+        self.assertEqual(result.raw.count(b'x'), 2200)
+
+        # Far more than the PTY holds at once, so writes come up short
+        result = run_with_pty(
+            command=["sh", "-c", "stty raw -echo; head -c 20000 | wc -c"],
+            input_tokens=parse_input_string("y" * 20000),
+            delay_ms=0,
+            timeout=2.0,
+        )
+        self.assertEqual(result.output.strip(), "20000")
+
+    def test_default_delay_sends_long_typed_text(self):
+        """Test that more than IOV_MAX typed characters at the default delay arrive whole."""
+        result = run_with_pty(
+            command=["cat"],
+            input_tokens=parse_input_string("z" * 1100 + "[enter]"),
+            timeout=1.0,
+        )
+        self.assertEqual(result.raw.count(b'z'), 2200)
+
+
 class TestExpectScreenVerification(unittest.TestCase):
     """Tests for EXPECT_SCREEN verification during PTY execution."""
 
-    def setUp(self):
-        """Create a temporary directory for test snapshots."""
-        self.test_dir = tempfile.mkdtemp()
+    @classmethod
+    def setUpClass(cls):
+        """Create one temporary directory for the snapshots of every test.
 
-    def tearDown(self):
+        Each test writes its snapshots under names of its own.
+        """
+        cls.test_dir = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
         """Clean up temporary directory."""
-        shutil.rmtree(self.test_dir)
+        shutil.rmtree(cls.test_dir)
 
     def test_expect_screen_passes_with_matching_content(self):
         """Test that EXPECT_SCREEN passes when screen matches snapshot."""
         # First, run dim to capture the actual screen output
-        input_str = "[sleep:50][ctrl-q]"
+        input_str = "[wait:NORMAL][ctrl-q]"
         input_tokens = parse_input_string(input_str)
 
         # Get the actual screen first
@@ -71,7 +162,7 @@ class TestExpectScreenVerification(unittest.TestCase):
             f.write(result.output)
 
         # Now run again with EXPECT_SCREEN - should pass
-        input_str2 = "[sleep:50][EXPECT_SCREEN:snapshot001.txt][ctrl-q]"
+        input_str2 = "[wait:NORMAL][EXPECT_SCREEN:snapshot001.txt][ctrl-q]"
         input_tokens2 = parse_input_string(input_str2)
 
         result2 = run_with_pty(
@@ -94,15 +185,13 @@ class TestExpectScreenVerification(unittest.TestCase):
 
     def test_expect_screen_fails_with_mismatched_content(self):
         """Test that EXPECT_SCREEN fails when screen doesn't match snapshot."""
-        from testty import ScreenExpectationError
-
         # Create a snapshot file with different content
         snapshot_path = os.path.join(self.test_dir, "wrong.txt")
         with open(snapshot_path, 'w') as f:
             f.write("This is completely wrong content")
 
         # Open hello_world.txt but expect different content
-        input_str = "[sleep:50][EXPECT_SCREEN:wrong.txt][ctrl-q]"
+        input_str = "[wait:NORMAL][EXPECT_SCREEN:wrong.txt][ctrl-q]"
         input_tokens = parse_input_string(input_str)
 
         # Should raise ScreenExpectationError
@@ -125,9 +214,7 @@ class TestExpectScreenVerification(unittest.TestCase):
 
     def test_expect_screen_fails_with_missing_file(self):
         """Test that EXPECT_SCREEN fails when snapshot file doesn't exist."""
-        from testty import ScreenExpectationError
-
-        input_str = "[sleep:50][EXPECT_SCREEN:nonexistent.txt][ctrl-q]"
+        input_str = "[wait:NORMAL][EXPECT_SCREEN:nonexistent.txt][ctrl-q]"
         input_tokens = parse_input_string(input_str)
 
         # Should raise ScreenExpectationError
@@ -146,10 +233,59 @@ class TestExpectScreenVerification(unittest.TestCase):
         self.assertEqual(ctx.exception.snapshot_file, "nonexistent.txt")
         self.assertIsNone(ctx.exception.expected_screen)
 
+    def test_expect_screen_waits_for_slow_redraw(self):
+        """Test that EXPECT_SCREEN keeps waiting, up to timeout, for a late redraw."""
+        snapshot_path = os.path.join(self.test_dir, "slow.txt")
+        with open(snapshot_path, 'w') as f:
+            f.write("a\nredrawn\n")
+
+        result = run_with_pty(
+            command=["sh", "-c", "read x; sleep 0.1; echo redrawn; sleep 1"],
+            input_tokens=parse_input_string("a[enter][EXPECT_SCREEN:slow.txt][ctrl-c]"),
+            timeout=2.0,
+            snapshot_dir=self.test_dir
+        )
+        self.assertTrue(result.screen_expectations[0].passed)
+
+    def test_expect_screen_after_program_exits(self):
+        """Test that EXPECT_SCREEN after the quitting key checks the final screen."""
+        snapshot_path = os.path.join(self.test_dir, "after_exit.txt")
+        with open(snapshot_path, 'w') as f:
+            f.write("a\nbye\n")
+
+        result = run_with_pty(
+            command=["sh", "-c", "read x; echo bye; exit 0"],
+            input_tokens=parse_input_string("a[enter][EXPECT_SCREEN:after_exit.txt]"),
+            timeout=1.0,
+            snapshot_dir=self.test_dir
+        )
+        self.assertEqual(len(result.screen_expectations), 1)
+        self.assertTrue(result.screen_expectations[0].passed)
+
+        # A missing snapshot still fails rather than being skipped
+        with self.assertRaises(ScreenExpectationError) as ctx:
+            run_with_pty(
+                command=["sh", "-c", "read x; exit 0"],
+                input_tokens=parse_input_string("a[enter][EXPECT_SCREEN:nonexistent.txt]"),
+                timeout=1.0,
+                snapshot_dir=self.test_dir
+            )
+        self.assertEqual(ctx.exception.snapshot_file, "nonexistent.txt")
+
+    def test_load_snapshot_sees_rewritten_file(self):
+        """Test that a cached snapshot is reloaded after the file changes."""
+        snapshot_path = os.path.join(self.test_dir, "reloaded.txt")
+        with open(snapshot_path, 'w') as f:
+            f.write("first  \n\n")
+        self.assertEqual(load_snapshot(snapshot_path), ("first  ", ("first",)))
+
+        with open(snapshot_path, 'w') as f:
+            f.write("second\nscreen\n")
+        self.assertEqual(load_snapshot(snapshot_path),
+                         ("second\nscreen", ("second", "screen")))
+
     def test_multiple_expect_screen_first_fails(self):
         """Test that multiple EXPECT_SCREEN tokens fail fast on first mismatch."""
-        from testty import ScreenExpectationError
-
         # Create two snapshot files with wrong content
         snapshot1_path = os.path.join(self.test_dir, "snap1.txt")
         snapshot2_path = os.path.join(self.test_dir, "snap2.txt")
@@ -160,7 +296,7 @@ class TestExpectScreenVerification(unittest.TestCase):
         with open(snapshot2_path, 'w') as f:
             f.write("Wrong content 2")
 
-        input_str = "[sleep:50][EXPECT_SCREEN:snap1.txt]j[sleep:20][EXPECT_SCREEN:snap2.txt][ctrl-q]"
+        input_str = "[wait:NORMAL][EXPECT_SCREEN:snap1.txt]j[EXPECT_SCREEN:snap2.txt][ctrl-q]"
         input_tokens = parse_input_string(input_str)
 
         # Should fail on the first EXPECT_SCREEN
@@ -184,16 +320,12 @@ class TestTerminalResponseFiltering(unittest.TestCase):
 
     def test_filter_cursor_position_report(self):
         """Test that cursor position reports are filtered."""
-        from savetty import is_terminal_response
-
         # ESC [ 2 ; 2 R  (cursor at row 2, col 2)
         data = b'\x1b[2;2R'
         self.assertEqual(is_terminal_response(data, 0), 6)
 
     def test_filter_device_attributes_response(self):
         """Test that device attributes responses are filtered."""
-        from savetty import is_terminal_response
-
         # ESC [ > 84 ; 0 ; 0 c
         data = b'\x1b[>84;0;0c'
         self.assertEqual(is_terminal_response(data, 0), 10)
@@ -204,8 +336,6 @@ class TestTerminalResponseFiltering(unittest.TestCase):
 
     def test_no_filter_arrow_keys(self):
         """Test that arrow keys are NOT filtered (they're user input)."""
-        from savetty import is_terminal_response
-
         # ESC [ A (up arrow)
         data = b'\x1b[A'
         self.assertEqual(is_terminal_response(data, 0), 0)
@@ -216,15 +346,11 @@ class TestTerminalResponseFiltering(unittest.TestCase):
 
     def test_no_filter_regular_escape(self):
         """Test that regular escape is NOT filtered."""
-        from savetty import is_terminal_response
-
         data = b'\x1b'
         self.assertEqual(is_terminal_response(data, 0), 0)
 
     def test_filter_at_offset(self):
         """Test filtering at a non-zero offset."""
-        from savetty import is_terminal_response
-
         # b'abc\x1b[5;10Rxyz' - the sequence \x1b[5;10R is 7 bytes
         data = b'abc\x1b[5;10Rxyz'
         self.assertEqual(is_terminal_response(data, 3), 7)
@@ -235,53 +361,40 @@ class TestSavettyByteConversion(unittest.TestCase):
 
     def test_byte_to_sequence_imports(self):
         """Test that savetty can be imported."""
-        from savetty import byte_to_sequence
         self.assertTrue(callable(byte_to_sequence))
 
     def test_byte_to_sequence_regular_char(self):
         """Test converting regular ASCII characters."""
-        from savetty import byte_to_sequence
-
         parts, is_enter = byte_to_sequence(ord('a'), None, 0)
         self.assertEqual(parts, ['a'])
         self.assertFalse(is_enter)
 
     def test_byte_to_sequence_enter(self):
         """Test converting Enter key."""
-        from savetty import byte_to_sequence
-
         parts, is_enter = byte_to_sequence(0x0d, None, 0)
         self.assertEqual(parts, ['[enter]'])
         self.assertTrue(is_enter)
 
     def test_byte_to_sequence_escape(self):
         """Test converting Escape key."""
-        from savetty import byte_to_sequence
-
         parts, is_enter = byte_to_sequence(0x1b, None, 0)
         self.assertEqual(parts, ['[esc]'])
         self.assertFalse(is_enter)
 
     def test_byte_to_sequence_tab(self):
         """Test converting Tab key."""
-        from savetty import byte_to_sequence
-
         parts, is_enter = byte_to_sequence(0x09, None, 0)
         self.assertEqual(parts, ['[tab]'])
         self.assertFalse(is_enter)
 
     def test_byte_to_sequence_backspace(self):
         """Test converting Backspace key."""
-        from savetty import byte_to_sequence
-
         parts, is_enter = byte_to_sequence(0x7f, None, 0)
         self.assertEqual(parts, ['[backspace]'])
         self.assertFalse(is_enter)
 
     def test_byte_to_sequence_ctrl_char(self):
         """Test converting control characters."""
-        from savetty import byte_to_sequence
-
         # Ctrl-C is byte 0x03
         parts, is_enter = byte_to_sequence(0x03, None, 0)
         self.assertEqual(parts, ['[ctrl-c]'])
@@ -294,21 +407,149 @@ class TestSavettyByteConversion(unittest.TestCase):
 
     def test_byte_to_sequence_with_sleep(self):
         """Test that sleep tokens are generated for pauses."""
-        from savetty import byte_to_sequence
-
         # 600ms pause should generate a sleep token (default threshold is 500ms)
         parts, is_enter = byte_to_sequence(ord('x'), 0.0, 0.6, min_sleep_threshold_ms=500)
         self.assertEqual(parts, ['[sleep:600]', 'x'])
 
     def test_byte_to_sequence_no_sleep_for_short_pause(self):
         """Test that short pauses don't generate sleep tokens."""
-        from savetty import byte_to_sequence
-
         # 400ms pause should not generate a sleep token (below 500ms threshold)
         parts, is_enter = byte_to_sequence(ord('x'), 0.0, 0.4, min_sleep_threshold_ms=500)
         self.assertEqual(parts, ['x'])
 
 
+class TestSavettyProcessInput(unittest.TestCase):
+    """Tests for savetty keystroke recording."""
+
+    def test_process_input_arrow_and_delete_keys(self):
+        """Test that arrow and delete escape sequences become single tokens."""
+        recorded = bytearray()
+        process_input_bytes(b'\x1b[Ax\x1b[D\x1b[3~\x1b', recorded, None, 0, None)
+        self.assertEqual(recorded, b'[up]x[left][delete][esc]')
+
+    def test_process_input_snapshot_numbers(self):
+        """Test that each Enter is given the next snapshot number."""
+        recorded = bytearray()
+        _, count, snap_nums = process_input_bytes(b'ab\rcd\r', recorded, None, 2, None)
+        self.assertEqual(recorded, b'ab[enter]cd[enter]')
+        self.assertEqual(count, 4)
+        self.assertEqual(snap_nums, [3, 4])
+
+    def test_process_input_single_bytes(self):
+        """Test that one-byte reads record the same tokens as longer chunks."""
+        data = b'a\x1b\t\x01\x7f\xe9\r'
+        chunked = bytearray()
+        process_input_bytes(data, chunked, None, 0, None)
+        single = bytearray()
+        count = 0
+        for i in range(len(data)):
+            _, count, _ = process_input_bytes(data[i:i+1], single, None, count, None)
+        self.assertEqual(single, chunked)
+        self.assertEqual(count, 1)
+
+    def test_process_input_skips_terminal_responses(self):
+        """Test that terminal responses are not recorded as keystrokes."""
+        recorded = bytearray()
+        last_time, _, _ = process_input_bytes(b'\x1b[24;80R', recorded, None, 0, None)
+        self.assertEqual(recorded, b'')
+        self.assertIsNone(last_time)
+
+
+class TestSavettySnapshots(unittest.TestCase):
+    """Tests for savetty snapshot files."""
+
+    def setUp(self):
+        """Create a temporary directory for test snapshots."""
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Clean up temporary directory."""
+        shutil.rmtree(self.test_dir)
+
+    def test_copied_screen_is_saved_unchanged(self):
+        """Test that a copied screen keeps its contents after more output."""
+        screen = TerminalScreen(3, 10)
+        screen.process_output(b'hello')
+        snap = copy_screen(screen)
+        screen.process_output(b' world')
+
+        filename = save_snapshot(snap, 1, self.test_dir)
+        self.assertEqual(filename, os.path.join(self.test_dir, 'snapshot001.txt'))
+        with open(filename) as f:
+            self.assertEqual(f.read(), 'hello\n')
+
+    def test_resize_emulates_pending_output_at_old_size(self):
+        """Test that output buffered before a resize is laid out at the old width."""
+        screen = TerminalScreen(2, 10)
+        pending_output = [b'0123456789', b'abc']
+        apply_resize(screen, pending_output, 2, 5)
+        self.assertEqual(pending_output, [])
+        self.assertEqual(screen.get_screen_text(), '01234\nabc')
+
+    def test_snapshot_writer_keeps_going_after_a_failure(self):
+        """Test that a snapshot that can't be saved is reported and later ones still are."""
+        screen = TerminalScreen(3, 10)
+        screen.process_output(b'ok')
+        snapshot_queue = queue.Queue()
+        # Snapshot 1 has no screen to render, so saving it raises
+        snapshot_queue.put((1, None))
+        snapshot_queue.put((2, screen))
+        snapshot_queue.put(None)
+
+        failures = []
+        snapshot_writer(snapshot_queue, self.test_dir, failures)
+        self.assertEqual([num for num, _ in failures], [1])
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'snapshot001.txt')))
+        with open(os.path.join(self.test_dir, 'snapshot002.txt')) as f:
+            self.assertEqual(f.read(), 'ok\n')
+
+    def test_records_with_stdin_from_dev_null(self):
+        """Test that recording works when stdin is not a terminal or pipe."""
+        savetty = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'savetty.py')
+        result = subprocess.run(
+            [sys.executable, savetty, 'sh', '-c', 'echo hi'],
+            stdin=subprocess.DEVNULL, capture_output=True, text=True,
+            cwd=self.test_dir, timeout=10,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("testty.py --run 'sh -c echo hi'", result.stdout)
+
+
+class TestTerminalScreen(unittest.TestCase):
+    """Tests for the testty.TerminalScreen emulator."""
+
+    def test_colored_output_renders_plain_text(self):
+        """Test that color sequences don't leave text on the screen."""
+        screen = TerminalScreen(2, 20)
+        screen.process_output(b'\x1b[33mdef\x1b[37m f\x1b[1;31m()\x1b[m')
+        self.assertEqual(screen.get_screen_text(), 'def f()')
+
+    def test_long_text_wraps_at_right_edge(self):
+        """Test that a run of text longer than a row wraps onto the next."""
+        screen = TerminalScreen(3, 4)
+        screen.process_output(b'abcdefghij\tx')
+        self.assertEqual(screen.get_screen_text(), 'abcd\nefgh\nij x')
+        # Filling the last row wraps back to its start, not off the screen
+        self.assertEqual((screen.cursor_row, screen.cursor_col), (2, 0))
+
+    def test_zero_size_screen_is_empty(self):
+        """Test that a terminal reporting no size (0x0) gives an empty screen."""
+        screen = TerminalScreen(0, 0)
+        screen.process_output(b'hi\r\n')
+        self.assertEqual(screen.get_screen_text(), '')
+
+    def test_resized_screen_keeps_contents(self):
+        """Test that resizing the screen keeps the text that still fits."""
+        screen = TerminalScreen(3, 10)
+        screen.process_output(b'hello\r\nworld')
+        screen.resize(2, 4)
+        self.assertEqual(screen.get_screen_text(), 'hell\nworl')
+        self.assertEqual((screen.cursor_row, screen.cursor_col), (1, 3))
+        screen.resize(3, 6)
+        screen.process_output(b'\x1b[3;1Hbye')
+        self.assertEqual(screen.get_screen_text(), 'hell\nworl\nbye')
+
+
 class TestRoundTrip(unittest.TestCase):
     """Test that sequences generated by savetty can be parsed by testty."""
 
@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 """
 testty - A tool for testing interactive TTY programs non-interactively
-Usage: testty --run PROGRAM [--input INPUT_STRING] [--output FILE] [--delay MS]
+Usage: testty --run PROGRAM [--input INPUT_STRING] [--output FILE] [--delay MAX_MS]
 """
 
 import sys
 import os
+import re
 import pty
 import time
+import selectors
 import argparse
+import functools
 import termios
 import struct
 import fcntl
@@ -48,67 +51,136 @@ class Result:
             self.screen_expectations = []
 
 
+# Bytes that may appear in the parameters of a CSI sequence
+_CSI_PARAM_BYTES = frozenset(b'0123456789;?')
+
+# SGR (color/attribute) sequences; they don't change the screen text
+_SGR_RE = re.compile(rb'\x1b\[[0-9;]*m')
+
+# Bytes that process_output handles itself; everything else is text
+_CONTROL_RE = re.compile(rb'[\x1b\r\n\t\b]')
+
+
+def _parse_csi_params(data, i, j):
+    """Return the ;-separated numbers in data[i:j], empty ones as 0.
+
+    data[i:j] holds only _CSI_PARAM_BYTES, so everything other than ';'
+    is a digit once private sequences (containing '?') are ruled out;
+    those have no numeric parameters.
+    """
+    if data.find(b'?', i, j) != -1:
+        return []
+    params = []
+    value = 0
+    seen = False
+    for b in data[i:j]:
+        if b == 0x3b:  # ';'
+            params.append(value)
+            value = 0
+            seen = False
+        else:
+            value = value * 10 + b - 0x30
+            seen = True
+    if seen or params:
+        params.append(value)
+    return params
+
+
 class TerminalScreen:
     """Simple terminal screen emulator that processes ANSI escape sequences."""
 
     def __init__(self, rows=24, cols=80):
         self.rows = rows
         self.cols = cols
-        self.buffer = [[' ' for _ in range(cols)] for _ in range(rows)]
+        # One byte per cell, row after row
+        self.buffer = bytearray(b' ' * (rows * cols))
         self.cursor_row = 0
         self.cursor_col = 0
         self.saved_cursor = (0, 0)
 
+    def resize(self, rows, cols):
+        """Resize the screen, keeping the contents that still fit."""
+        if rows == self.rows and cols == self.cols:
+            return
+        buffer = bytearray(b' ' * (rows * cols))
+        width = min(cols, self.cols)
+        for r in range(min(rows, self.rows)):
+            start = r * self.cols
+            buffer[r * cols:r * cols + width] = self.buffer[start:start + width]
+        self.buffer = buffer
+        self.rows = rows
+        self.cols = cols
+        self.cursor_row = min(self.cursor_row, rows - 1)
+        self.cursor_col = min(self.cursor_col, cols - 1)
+
     def process_output(self, data):
-        """Process terminal output byte by byte."""
+        """Process terminal output, a run of text at a time."""
+        # Drop colors in one pass before walking the remaining bytes
+        data = _SGR_RE.sub(b'', data)
+
         i = 0
-        while i < len(data):
+        n = len(data)
+        while i < n:
+            # Copy everything up to the next control byte in one go
+            match = _CONTROL_RE.search(data, i)
+            j = match.start() if match else n
+            if j > i:
+                self._write_text(data[i:j])
+                i = j
+                if i >= n:
+                    break
+
+            b = data[i]
             # Check for escape sequence
-            if data[i:i+1] == b'\x1b':
+            if b == 0x1b:
                 i = self._process_escape(data, i)
-            elif data[i:i+1] == b'\r':
+            elif b == 0x0d:
                 # Carriage return
                 self.cursor_col = 0
                 i += 1
-            elif data[i:i+1] == b'\n':
+            elif b == 0x0a:
                 # Line feed
                 self.cursor_row = min(self.cursor_row + 1, self.rows - 1)
                 i += 1
-            elif data[i:i+1] == b'\t':
+            elif b == 0x09:
                 # Tab - move to next tab stop (every 8 chars)
                 self.cursor_col = ((self.cursor_col // 8) + 1) * 8
                 if self.cursor_col >= self.cols:
                     self.cursor_col = self.cols - 1
                 i += 1
-            elif data[i:i+1] == b'\b':
+            else:
                 # Backspace
                 self.cursor_col = max(0, self.cursor_col - 1)
                 i += 1
-            else:
-                # Regular character
-                try:
-                    char = chr(data[i])
-                    if self.cursor_row < self.rows and self.cursor_col < self.cols:
-                        self.buffer[self.cursor_row][self.cursor_col] = char
-                        self.cursor_col += 1
-                        if self.cursor_col >= self.cols:
-                            self.cursor_col = 0
-                            self.cursor_row = min(self.cursor_row + 1, self.rows - 1)
-                except (ValueError, UnicodeDecodeError):
-                    pass
-                i += 1
 
         return i
 
+    def _write_text(self, text):
+        """Write regular characters at the cursor, wrapping at the right edge."""
+        if self.cursor_row >= self.rows or self.cursor_col >= self.cols:
+            return
+        i = 0
+        n = len(text)
+        while i < n:
+            count = min(self.cols - self.cursor_col, n - i)
+            start = self.cursor_row * self.cols + self.cursor_col
+            self.buffer[start:start + count] = text[i:i + count]
+            i += count
+            self.cursor_col += count
+            if self.cursor_col >= self.cols:
+                self.cursor_col = 0
+                self.cursor_row = min(self.cursor_row + 1, self.rows - 1)
+
     def _process_escape(self, data, i):
         """Process ANSI escape sequence starting at position i."""
         if i + 1 >= len(data):
             return i + 1
 
-        if data[i+1:i+2] == b'[':
+        b = data[i+1]
+        if b == 0x5b:  # '['
             # CSI sequence
             return self._process_csi(data, i + 2)
-        elif data[i+1:i+2] == b']':
+        elif b == 0x5d:  # ']'
             # OSC sequence (operating system command) - skip it
             end = data.find(b'\x07', i)
             if end == -1:
@@ -125,178 +197,296 @@ class TerminalScreen:
         """Process CSI (Control Sequence Introducer) sequence."""
         # Find the end of the CSI sequence
         j = i
-        while j < len(data) and data[j:j+1] in b'0123456789;?':
+        n = len(data)
+        while j < n and data[j] in _CSI_PARAM_BYTES:
             j += 1
 
-        if j >= len(data):
-            return len(data)
+        if j >= n:
+            return n
 
-        command = chr(data[j])
-        params_str = data[i:j].decode('ascii', errors='ignore')
-        params = []
-        if params_str and not params_str.startswith('?'):
-            try:
-                params = [int(p) if p else 0 for p in params_str.split(';')]
-            except ValueError:
-                params = []
-
-        # Process the command
-        if command == 'H' or command == 'f':
-            # Cursor position
-            row = (params[0] - 1) if len(params) > 0 and params[0] > 0 else 0
-            col = (params[1] - 1) if len(params) > 1 and params[1] > 0 else 0
-            self.cursor_row = min(row, self.rows - 1)
-            self.cursor_col = min(col, self.cols - 1)
-        elif command == 'A':
-            # Cursor up
-            n = params[0] if params else 1
-            self.cursor_row = max(0, self.cursor_row - n)
-        elif command == 'B':
-            # Cursor down
-            n = params[0] if params else 1
-            self.cursor_row = min(self.rows - 1, self.cursor_row + n)
-        elif command == 'C':
-            # Cursor forward
-            n = params[0] if params else 1
-            self.cursor_col = min(self.cols - 1, self.cursor_col + n)
-        elif command == 'D':
-            # Cursor back
-            n = params[0] if params else 1
-            self.cursor_col = max(0, self.cursor_col - n)
-        elif command == 'J':
-            # Erase in display
-            n = params[0] if params else 0
-            if n == 0:
-                # Clear from cursor to end of screen
-                for c in range(self.cursor_col, self.cols):
-                    self.buffer[self.cursor_row][c] = ' '
-                for r in range(self.cursor_row + 1, self.rows):
-                    self.buffer[r] = [' '] * self.cols
-            elif n == 1:
-                # Clear from cursor to beginning of screen
-                for c in range(0, self.cursor_col + 1):
-                    self.buffer[self.cursor_row][c] = ' '
-                for r in range(0, self.cursor_row):
-                    self.buffer[r] = [' '] * self.cols
-            elif n == 2:
-                # Clear entire screen
-                self.buffer = [[' ' for _ in range(self.cols)] for _ in range(self.rows)]
-        elif command == 'K':
-            # Erase in line
-            n = params[0] if params else 0
-            if n == 0:
-                # Clear from cursor to end of line
-                for c in range(self.cursor_col, self.cols):
-                    self.buffer[self.cursor_row][c] = ' '
-            elif n == 1:
-                # Clear from cursor to beginning of line
-                for c in range(0, self.cursor_col + 1):
-                    self.buffer[self.cursor_row][c] = ' '
-            elif n == 2:
-                # Clear entire line
-                self.buffer[self.cursor_row] = [' '] * self.cols
-        elif command == 's':
-            # Save cursor position
-            self.saved_cursor = (self.cursor_row, self.cursor_col)
-        elif command == 'u':
-            # Restore cursor position
-            self.cursor_row, self.cursor_col = self.saved_cursor
-        # Ignore color codes (m), cursor visibility (?25h, ?25l), and other formatting
+        # Look up the command by its final byte; colors (m), cursor
+        # visibility (?25h, ?25l) and other formatting have no handler,
+        # so skip them before decoding their parameters
+        handler = self._CSI_HANDLERS.get(data[j])
+        if handler is None:
+            return j + 1
+
+        handler(self, _parse_csi_params(data, i, j))
 
         return j + 1
 
+    def _cursor_position(self, params):
+        """Move the cursor to row;col, counting from 1."""
+        row = (params[0] - 1) if len(params) > 0 and params[0] > 0 else 0
+        col = (params[1] - 1) if len(params) > 1 and params[1] > 0 else 0
+        self.cursor_row = min(row, self.rows - 1)
+        self.cursor_col = min(col, self.cols - 1)
+
+    def _cursor_up(self, params):
+        """Move the cursor up, stopping at the top row."""
+        n = params[0] if params else 1
+        self.cursor_row = max(0, self.cursor_row - n)
+
+    def _cursor_down(self, params):
+        """Move the cursor down, stopping at the bottom row."""
+        n = params[0] if params else 1
+        self.cursor_row = min(self.rows - 1, self.cursor_row + n)
+
+    def _cursor_forward(self, params):
+        """Move the cursor right, stopping at the last column."""
+        n = params[0] if params else 1
+        self.cursor_col = min(self.cols - 1, self.cursor_col + n)
+
+    def _cursor_back(self, params):
+        """Move the cursor left, stopping at the first column."""
+        n = params[0] if params else 1
+        self.cursor_col = max(0, self.cursor_col - n)
+
+    def _erase_in_display(self, params):
+        """Blank part or all of the screen."""
+        n = params[0] if params else 0
+        line = self.cursor_row * self.cols
+        if n == 0:
+            # Clear from cursor to end of screen
+            self._erase(line + min(self.cursor_col, self.cols), len(self.buffer))
+        elif n == 1:
+            # Clear from cursor to beginning of screen
+            self._erase(0, line + min(self.cursor_col + 1, self.cols))
+        elif n == 2:
+            # Clear entire screen
+            self._erase(0, len(self.buffer))
+
+    def _erase_in_line(self, params):
+        """Blank part or all of the cursor row."""
+        n = params[0] if params else 0
+        line = self.cursor_row * self.cols
+        if n == 0:
+            # Clear from cursor to end of line
+            self._erase(line + min(self.cursor_col, self.cols), line + self.cols)
+        elif n == 1:
+            # Clear from cursor to beginning of line
+            self._erase(line, line + min(self.cursor_col + 1, self.cols))
+        elif n == 2:
+            # Clear entire line
+            self._erase(line, line + self.cols)
+
+    def _save_cursor(self, params):
+        """Remember the cursor position."""
+        self.saved_cursor = (self.cursor_row, self.cursor_col)
+
+    def _restore_cursor(self, params):
+        """Move the cursor back to the saved position."""
+        self.cursor_row, self.cursor_col = self.saved_cursor
+
+    # CSI final byte -> handler
+    _CSI_HANDLERS = {
+        ord('H'): _cursor_position,
+        ord('f'): _cursor_position,
+        ord('A'): _cursor_up,
+        ord('B'): _cursor_down,
+        ord('C'): _cursor_forward,
+        ord('D'): _cursor_back,
+        ord('J'): _erase_in_display,
+        ord('K'): _erase_in_line,
+        ord('s'): _save_cursor,
+        ord('u'): _restore_cursor,
+    }
+
+    def _erase(self, start, end):
+        """Blank the cells from start up to end in the flat buffer."""
+        if start < end:
+            self.buffer[start:end] = b' ' * (end - start)
+
     def get_screen_text(self):
         """Return the current screen as a string."""
-        lines = []
-        for row in self.buffer:
-            line = ''.join(row).rstrip()
-            lines.append(line)
+        cols = self.cols
+        if not cols:
+            # A terminal that reports no size (0x0) has no cells to show
+            return ''
+        text = self.buffer.decode('latin-1')
+        lines = [text[r:r + cols].rstrip() for r in range(0, len(text), cols)]
 
-        # Remove trailing empty lines
-        while lines and not lines[-1]:
-            lines.pop()
-
-        return '\n'.join(lines)
+        # Drop trailing empty lines
+        return '\n'.join(lines).rstrip('\n')
 
 def parse_input_string(input_str):
     """Parse input string and convert special sequences to bytes."""
-    if not input_str:
-        return []
-
+    return list(_parse_input_tokens(input_str))
+
+# Named keys that map directly to the bytes a terminal sends
+_SPECIAL_KEYS = {
+    'enter': b'\r',
+    'tab': b'\t',
+    'esc': b'\x1b',
+    'backspace': b'\x7f',
+    'delete': b'\x1b[3~',
+    'up': b'\x1b[A',
+    'down': b'\x1b[B',
+    'right': b'\x1b[C',
+    'left': b'\x1b[D',
+}
+# ctrl-a through ctrl-z send the letter's control character
+_SPECIAL_KEYS.update((f'ctrl-{c}', bytes([ord(c) & 0x1f])) for c in 'abcdefghijklmnopqrstuvwxyz')
+
+# A bracketed special sequence, a run of plain text, or an unclosed '['
+_INPUT_TOKEN_RE = re.compile(r'\[([^\]]*)\]|([^\[]+)|\[')
+
+def _special_token(name):
+    """Return the token for the text between brackets in an input string."""
+    special = name.lower()
+    key = _SPECIAL_KEYS.get(special)
+    if key is not None:
+        return key
+    if special.startswith('ctrl-'):
+        key = special[5:]
+        if len(key) == 1:
+            # Convert ctrl-x to control character
+            return bytes([ord(key.upper()) & 0x1f])
+        raise ValueError(f"Invalid ctrl sequence: {special}")
+    if special.startswith('sleep:'):
+        # Sleep for specified milliseconds
+        return ('sleep', int(special[6:]))
+    if special.startswith('wait:'):
+        # Wait for text to appear on screen (case-sensitive)
+        return ('wait', name[5:])
+    if special.startswith('expect_screen:'):
+        # Expect screen to match snapshot file
+        return ('expect_screen', special[14:])
+    raise ValueError(f"Unknown special sequence: {special}")
+
+@functools.lru_cache(maxsize=256)
+def _parse_input_tokens(input_str):
+    """Parse input_str into a tuple of tokens; cached since tests reuse their scripts."""
     tokens = []
-    i = 0
-    while i < len(input_str):
-        if input_str[i] == '[':
-            # Find the closing bracket
-            end = input_str.find(']', i)
-            if end == -1:
-                tokens.append(input_str[i].encode())
-                i += 1
-                continue
+    for match in _INPUT_TOKEN_RE.finditer(input_str):
+        special, text = match.groups()
+        if text is not None:
+            tokens.extend(c.encode() for c in text)
+        elif special is not None:
+            tokens.append(_special_token(special))
+        else:
+            tokens.append(b'[')
+    return tuple(tokens)
 
-            special = input_str[i+1:end].lower()
-
-            # Handle special keys
-            if special == 'enter':
-                tokens.append(b'\r')
-            elif special == 'tab':
-                tokens.append(b'\t')
-            elif special == 'esc':
-                tokens.append(b'\x1b')
-            elif special == 'backspace':
-                tokens.append(b'\x7f')
-            elif special == 'delete':
-                tokens.append(b'\x1b[3~')
-            elif special.startswith('ctrl-'):
-                key = special[5:]
-                if len(key) == 1:
-                    # Convert ctrl-x to control character
-                    ctrl_char = ord(key.upper()) & 0x1f
-                    tokens.append(bytes([ctrl_char]))
-                else:
-                    raise ValueError(f"Invalid ctrl sequence: {special}")
-            elif special == 'up':
-                tokens.append(b'\x1b[A')
-            elif special == 'down':
-                tokens.append(b'\x1b[B')
-            elif special == 'right':
-                tokens.append(b'\x1b[C')
-            elif special == 'left':
-                tokens.append(b'\x1b[D')
-            elif special.startswith('sleep:'):
-                # Sleep for specified milliseconds
-                ms = int(special[6:])
-                tokens.append(('sleep', ms))
-            elif special.startswith('expect_screen:'):
-                # Expect screen to match snapshot file
-                snapshot_file = special[14:]  # Remove 'expect_screen:' prefix
-                tokens.append(('expect_screen', snapshot_file))
-            else:
-                raise ValueError(f"Unknown special sequence: {special}")
+# Snapshots bigger than this are read afresh each time rather than cached
+SNAPSHOT_CACHE_MAX_BYTES = 256 * 1024
+
+@functools.lru_cache(maxsize=128)
+def _read_snapshot(path, mtime_ns, size):
+    """Return (text, lines) for a snapshot; keyed on mtime and size so edits are seen."""
+    with open(path, 'r') as f:
+        text = f.read().rstrip('\n')
+    # Compare screens (strip trailing whitespace from lines)
+    return text, tuple(line.rstrip() for line in text.split('\n'))
+
+def load_snapshot(path):
+    """Return the snapshot text and its right-stripped lines.
+
+    Raises FileNotFoundError if there is no snapshot at path.
+    """
+    st = os.stat(path)
+    if st.st_size > SNAPSHOT_CACHE_MAX_BYTES:
+        return _read_snapshot.__wrapped__(path, st.st_mtime_ns, st.st_size)
+    return _read_snapshot(path, st.st_mtime_ns, st.st_size)
+
+def is_printable_key(token):
+    """Return True for a token that types a single printable ASCII character."""
+    return isinstance(token, bytes) and len(token) == 1 and 0x20 <= token[0] <= 0x7e
 
-            i = end + 1
+def batch_keys(tokens, can_batch=lambda token: isinstance(token, bytes)):
+    """Group each run of consecutive key tokens into a list, sent in one write.
+
+    can_batch decides which key tokens may join a run; by default every key
+    does. The last token is left on its own so the screen can still be
+    captured before it is sent.
+    """
+    batched = []
+    for token in tokens[:-1]:
+        if can_batch(token):
+            if batched and isinstance(batched[-1], list):
+                batched[-1].append(token)
+            else:
+                batched.append([token])
         else:
-            tokens.append(input_str[i].encode())
-            i += 1
+            batched.append(token)
+    batched.extend(tokens[-1:])
+    return batched
 
-    return tokens
+def screen_matches(actual_screen, expected_lines):
+    """Return True if actual_screen equals expected_lines, ignoring trailing spaces.
+
+    Stops at the first differing line, so the repeated checks made while
+    waiting for a screen to appear are cheap while it is still changing.
+    """
+    actual_lines = actual_screen.split('\n')
+    return (len(actual_lines) == len(expected_lines) and
+            all(a.rstrip() == e for a, e in zip(actual_lines, expected_lines)))
 
 def set_terminal_size(fd, rows=24, cols=80):
     """Set the terminal size for the PTY."""
     winsize = struct.pack("HHHH", rows, cols, 0, 0)
     fcntl.ioctl(fd, termios.TIOCSWINSZ, winsize)
 
-def run_with_pty(command, input_tokens, delay_ms=10, timeout=5.0, rows=24, cols=80, snapshot_dir=None):
+def spawn_in_pty(command, master_fd, slave_fd, cwd=None):
+    """Start command in a new session with the PTY slave as its terminal.
+
+    Uses posix_spawn where available, which avoids copying the parent's
+    address space; it has no chdir action, so a cwd falls back to fork.
+    Returns the child's pid.
+    """
+    if cwd is None and hasattr(os, 'posix_spawnp'):
+        # Opening the slave after setsid makes it the controlling terminal
+        file_actions = [
+            (os.POSIX_SPAWN_OPEN, 0, os.ttyname(slave_fd), os.O_RDWR, 0),
+            (os.POSIX_SPAWN_DUP2, 0, 1),
+            (os.POSIX_SPAWN_DUP2, 0, 2),
+        ]
+        try:
+            return os.posix_spawnp(command[0], command, os.environ,
+                                   file_actions=file_actions, setsid=True)
+        except OSError:
+            # Let the forked child report the failure as exit code 127
+            pass
+
+    pid = os.fork()
+    if pid == 0:
+        # Child process
+        os.close(master_fd)
+
+        # Make the PTY the controlling terminal
+        os.setsid()
+
+        # Redirect stdin, stdout, stderr to the slave PTY
+        os.dup2(slave_fd, 0)
+        os.dup2(slave_fd, 1)
+        os.dup2(slave_fd, 2)
+
+        if slave_fd > 2:
+            os.close(slave_fd)
+
+        if cwd is not None:
+            os.chdir(cwd)
+
+        # Execute the command; never fall back into the caller's code
+        try:
+            os.execvp(command[0], command)
+        finally:
+            os._exit(127)
+    return pid
+
+def run_with_pty(command, input_tokens, delay_ms=10, timeout=5.0, rows=24, cols=80, snapshot_dir=None, cwd=None):
     """Run a command in a PTY and send input tokens to it.
 
     Args:
         command: List of command and arguments to run
         input_tokens: List of input tokens (from parse_input_string)
-        delay_ms: Delay in milliseconds between keystrokes
+        delay_ms: Maximum delay in milliseconds between keystrokes; the next
+            key is sent as soon as the program produces output
         timeout: Timeout in seconds
         rows: Terminal rows
         cols: Terminal columns
         snapshot_dir: Directory containing snapshot files for EXPECT_SCREEN verification
+        cwd: Directory to run the command in (defaults to the current directory)
 
     Returns:
         Result object with output, raw, did_exit, exit_code, and screen_expectations fields
@@ -306,8 +496,9 @@ def run_with_pty(command, input_tokens, delay_ms=10, timeout=5.0, rows=24, cols=
     snapshot_screen = None
     process_exited = False
     exit_code = None
-    raw_output = b''
+    raw_output = bytearray()
     screen_expectations = []
+    sel = None
 
     # Create a pseudo-terminal
     master_fd, slave_fd = pty.openpty()
@@ -316,170 +507,222 @@ def run_with_pty(command, input_tokens, delay_ms=10, timeout=5.0, rows=24, cols=
     set_terminal_size(master_fd, rows, cols)
 
     try:
-        # Fork the process
-        pid = os.fork()
-
-        if pid == 0:
-            # Child process
-            os.close(master_fd)
+        pid = spawn_in_pty(command, master_fd, slave_fd, cwd)
+        os.close(slave_fd)
 
-            # Make the PTY the controlling terminal
-            os.setsid()
+        # Set non-blocking mode on master_fd
+        flags = fcntl.fcntl(master_fd, fcntl.F_GETFL)
+        fcntl.fcntl(master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
 
-            # Redirect stdin, stdout, stderr to the slave PTY
-            os.dup2(slave_fd, 0)
-            os.dup2(slave_fd, 1)
-            os.dup2(slave_fd, 2)
-
-            if slave_fd > 2:
-                os.close(slave_fd)
-
-            # Execute the command
-            os.execvp(command[0], command)
-        else:
-            # Parent process
-            os.close(slave_fd)
+        # One selector for every wait on the PTY (epoll on Linux)
+        sel = selectors.DefaultSelector()
+        sel.register(master_fd, selectors.EVENT_READ)
 
-            # Set non-blocking mode on master_fd
-            flags = fcntl.fcntl(master_fd, fcntl.F_GETFL)
-            fcntl.fcntl(master_fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        # Give the program a moment to start, moving on as soon as it draws
+        sel.select(0.02)
 
-            # Give the program a moment to start
-            time.sleep(0.02)
+        def drain():
+            """Read everything the program has written so far.
 
-            # Read initial output
-            try:
-                chunk = os.read(master_fd, 4096)
-                raw_output += chunk
+            Returns False if there was nothing to read.
+            """
+            got_output = False
+            while True:
+                try:
+                    chunk = os.read(master_fd, 65536)
+                except OSError:
+                    # No more data for now, or the program has exited
+                    return got_output
+                if not chunk:
+                    return got_output
+                got_output = True
+                raw_output.extend(chunk)
                 screen.process_output(chunk)
-            except OSError:
-                pass
-
-            # Send input tokens, but capture screen before the last one
-            for i, token in enumerate(input_tokens):
-                # Take a snapshot before the last token (usually the quit command)
-                if i == len(input_tokens) - 1:
-                    snapshot_screen = screen.get_screen_text()
-
-                if isinstance(token, tuple) and token[0] == 'sleep':
-                    time.sleep(token[1] / 1000.0)
-                    # After sleep, also read output
-                    try:
-                        chunk = os.read(master_fd, 4096)
-                        raw_output += chunk
-                        screen.process_output(chunk)
-                    except OSError:
-                        pass
-                elif isinstance(token, tuple) and token[0] == 'expect_screen':
-                    # Verify screen matches snapshot file
-                    snapshot_file = token[1]
-                    if snapshot_dir:
-                        snapshot_path = os.path.join(snapshot_dir, snapshot_file)
-                    else:
-                        snapshot_path = snapshot_file
-
-                    # Wait a bit for any pending output
-                    time.sleep(0.05)
-                    try:
-                        chunk = os.read(master_fd, 4096)
-                        raw_output += chunk
-                        screen.process_output(chunk)
-                    except OSError:
-                        pass
 
-                    actual_screen = screen.get_screen_text()
-                    expectation = ScreenExpectation(snapshot_file=snapshot_file, actual_screen=actual_screen)
-
-                    try:
-                        with open(snapshot_path, 'r') as f:
-                            expected_screen = f.read().rstrip('\n')
-                        # Compare screens (strip trailing whitespace from lines)
-                        actual_lines = [line.rstrip() for line in actual_screen.split('\n')]
-                        expected_lines = [line.rstrip() for line in expected_screen.split('\n')]
-                        expectation.passed = actual_lines == expected_lines
-                    except FileNotFoundError:
-                        expectation.passed = False
-                        expected_screen = None
-
-                    screen_expectations.append(expectation)
-
-                    # On failure, write actual screen to /tmp and raise exception
-                    if not expectation.passed:
-                        import tempfile
-                        # Write actual screen to temp file
-                        fd, tmp_path = tempfile.mkstemp(prefix='testty_actual_', suffix='.txt', dir='/tmp')
-                        with os.fdopen(fd, 'w') as f:
-                            f.write(actual_screen)
-                            if actual_screen and not actual_screen.endswith('\n'):
-                                f.write('\n')
-
-                        raise ScreenExpectationError(
-                            snapshot_file=snapshot_file,
-                            actual_screen=actual_screen,
-                            expected_screen=expected_screen if 'expected_screen' in dir() else None,
-                            tmp_path=tmp_path
-                        )
-                else:
-                    os.write(master_fd, token)
-                    time.sleep(delay_ms / 1000.0)
-
-                    # Read any output after each input
-                    try:
-                        chunk = os.read(master_fd, 4096)
-                        raw_output += chunk
-                        screen.process_output(chunk)
-                    except OSError:
-                        pass
-
-            # Wait a bit for final output
-            time.sleep(0.05)
-
-            # Read remaining output
-            start_time = time.time()
-            while time.time() - start_time < timeout:
+        def send(data):
+            """Write all of data to the program.
+
+            When the PTY's input queue is full, wait for it to have room,
+            reading the program's output meanwhile so it is never stuck
+            writing while we are stuck waiting for it to read.
+            """
+            view = memoryview(data)
+            while view:
                 try:
-                    chunk = os.read(master_fd, 4096)
-                    if chunk:
-                        raw_output += chunk
-                        screen.process_output(chunk)
-                    else:
-                        break
+                    view = view[os.write(master_fd, view):]
+                except BlockingIOError:
+                    pass
                 except OSError:
-                    # No more data
-                    break
-
-                # Check if process is still running
+                    # The program has exited and closed the terminal
+                    return
+                if not view:
+                    return
+                sel.modify(master_fd, selectors.EVENT_READ | selectors.EVENT_WRITE)
                 try:
-                    wpid, status = os.waitpid(pid, os.WNOHANG)
-                    if wpid == pid:
-                        process_exited = True
-                        exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else None
-                        break
-                except ChildProcessError:
-                    process_exited = True
-                    break
-
-            # Check one more time if process exited after timeout
+                    events = sel.select(timeout)
+                finally:
+                    sel.modify(master_fd, selectors.EVENT_READ)
+                if not events:
+                    # The program stopped reading its input
+                    return
+                if events[0][1] & selectors.EVENT_READ and not drain() and reap():
+                    return
+
+        def settle():
+            """Wait up to delay_ms for the program to respond to a key.
+
+            Once output starts, keep reading until it has been quiet for
+            2ms, so the next key is sent only after the redraw is complete.
+            """
+            deadline = time.time() + delay_ms / 1000.0
+            if not sel.select(delay_ms / 1000.0):
+                return
+            while drain():
+                remaining = deadline - time.time()
+                if remaining <= 0 or not sel.select(min(0.002, remaining)):
+                    return
+
+        def reap():
+            """Return True once the program has exited, recording its exit code."""
+            nonlocal process_exited, exit_code
             if not process_exited:
                 try:
                     wpid, status = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    process_exited = True
+                else:
                     if wpid == pid:
                         process_exited = True
                         exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else None
-                except ChildProcessError:
-                    process_exited = True
+            return process_exited
+
+        # Read initial output
+        drain()
+
+        # Without a delay between keys, send each run of keys in one write.
+        # Otherwise only typed text is coalesced; control keys still wait
+        # for the program to respond before the next key goes out.
+        if delay_ms == 0:
+            input_tokens = batch_keys(input_tokens)
+        else:
+            input_tokens = batch_keys(input_tokens, is_printable_key)
+
+        # Send input tokens, but capture screen before the last one
+        for i, token in enumerate(input_tokens):
+            # Take a snapshot before the last token (usually the quit command)
+            if i == len(input_tokens) - 1:
+                snapshot_screen = screen.get_screen_text()
+
+            # Nothing left to type into once the program has quit, but
+            # remaining screen expectations are still checked against the
+            # final screen
+            if process_exited and not (isinstance(token, tuple) and token[0] == 'expect_screen'):
+                continue
+
+            if isinstance(token, tuple) and token[0] == 'sleep':
+                # Keep reading while we wait so a chatty program never
+                # fills the PTY buffer and blocks on its own output
+                deadline = time.time() + token[1] / 1000.0
+                while True:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    if sel.select(remaining) and not drain():
+                        # Readable with nothing to read means the program
+                        # exited; sleep out the rest of the pause
+                        time.sleep(max(0, deadline - time.time()))
+                        break
+                drain()
+            elif isinstance(token, tuple) and token[0] == 'wait':
+                # Read output until the text is on screen, giving up after timeout
+                deadline = time.time() + timeout
+                while token[1] not in screen.get_screen_text():
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    # Readable with nothing to read means the program exited
+                    if not sel.select(remaining) or not drain():
+                        break
+            elif isinstance(token, tuple) and token[0] == 'expect_screen':
+                # Verify screen matches snapshot file
+                snapshot_file = token[1]
+                if snapshot_dir:
+                    snapshot_path = os.path.join(snapshot_dir, snapshot_file)
+                else:
+                    snapshot_path = snapshot_file
 
-            # Try to terminate the process if it's still running
-            if not process_exited:
                 try:
-                    os.kill(pid, 15)  # SIGTERM
-                    wpid, status = os.waitpid(pid, 0)
-                    if wpid == pid:
-                        exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else None
-                except (ProcessLookupError, ChildProcessError):
-                    process_exited = True
+                    expected_screen, expected_lines = load_snapshot(snapshot_path)
+                except FileNotFoundError:
+                    expected_screen = None
+                    expected_lines = None
+
+                # Compare after each read, passing as soon as the screen
+                # matches and giving up after timeout. Readable with nothing
+                # to read means the program exited, so the screen is final.
+                deadline = time.time() + timeout
+                while True:
+                    actual_screen = screen.get_screen_text()
+                    passed = expected_lines is not None and screen_matches(actual_screen, expected_lines)
+                    if passed or expected_lines is None:
+                        break
+                    if not sel.select(max(0, deadline - time.time())) or not drain():
+                        break
+
+                expectation = ScreenExpectation(snapshot_file=snapshot_file, actual_screen=actual_screen)
+                expectation.passed = passed
+
+                screen_expectations.append(expectation)
+
+                # On failure, write actual screen to /tmp and raise exception
+                if not expectation.passed:
+                    import tempfile
+                    # Write actual screen to temp file
+                    fd, tmp_path = tempfile.mkstemp(prefix='testty_actual_', suffix='.txt', dir='/tmp')
+                    with os.fdopen(fd, 'w') as f:
+                        f.write(actual_screen)
+                        if actual_screen and not actual_screen.endswith('\n'):
+                            f.write('\n')
+
+                    raise ScreenExpectationError(
+                        snapshot_file=snapshot_file,
+                        actual_screen=actual_screen,
+                        expected_screen=expected_screen,
+                        tmp_path=tmp_path
+                    )
+            elif isinstance(token, list):
+                send(b''.join(token))
+                settle()
+                reap()
+            else:
+                send(token)
+                settle()
+                reap()
+
+        # Read remaining output until the program exits, or until it has
+        # been quiet for 50ms
+        start_time = time.time()
+        while time.time() - start_time < timeout:
+            drain()
+            if reap() or not sel.select(0.05):
+                break
+
+        # Check one more time if process exited after timeout
+        reap()
+
+        # Try to terminate the process if it's still running
+        if not process_exited:
+            try:
+                os.kill(pid, 15)  # SIGTERM
+                wpid, status = os.waitpid(pid, 0)
+                if wpid == pid:
+                    exit_code = os.WEXITSTATUS(status) if os.WIFEXITED(status) else None
+            except (ProcessLookupError, ChildProcessError):
+                process_exited = True
 
     finally:
+        if sel is not None:
+            sel.close()
         os.close(master_fd)
 
     # Return the snapshot if we took one and current screen is empty
@@ -489,7 +732,7 @@ def run_with_pty(command, input_tokens, delay_ms=10, timeout=5.0, rows=24, cols=
 
     return Result(
         output=final_screen,
-        raw=raw_output,
+        raw=bytes(raw_output),
         did_exit=process_exited,
         exit_code=exit_code,
         screen_expectations=screen_expectations
@@ -506,7 +749,7 @@ def main():
         epilog="""
 Examples:
   testty --run "./dim test.txt" --input "hello[ctrl-s][ctrl-q]"
-  testty --run "vim" --input "iHello World[esc]:wq[enter]" --delay 50
+  testty --run "vim" --input "iHello World[esc][sleep:50]:wq[enter]"
   testty --run "./dim" --input "test[ctrl-s]file.txt[enter][ctrl-q]" --output result.txt
 
 Special sequences:
@@ -517,18 +760,28 @@ Special sequences:
   [backspace]  - Backspace
   [up/down/left/right] - Arrow keys
   [sleep:N]    - Sleep for N milliseconds
+  [wait:TEXT]  - Wait (up to --timeout) until TEXT appears on screen
   [EXPECT_SCREEN:file.txt] - Verify screen matches snapshot file
+
+Pacing:
+  After each key, or each run of typed text (sent in one write), testty
+  waits up to --delay ms for the program to respond and moves on as soon
+  as its output goes quiet. With --delay 0 every run of keys is sent in
+  one write. Use [sleep:N] where a program needs a fixed pause.
         """
     )
 
     parser.add_argument('--run', required=True, help='Command to run')
     parser.add_argument('--input', default='', help='Input string to send')
     parser.add_argument('--output', help='File to write output to (default: stdout)')
-    parser.add_argument('--delay', type=int, default=10, help='Delay in ms between keystrokes (default: 10)')
+    parser.add_argument('--delay', type=int, default=10, metavar='MAX_MS',
+                        help='Longest wait in ms for the program to respond before the next key; '
+                             'see Pacing below (default: 10)')
     parser.add_argument('--timeout', type=float, default=5.0, help='Timeout in seconds (default: 5.0)')
     parser.add_argument('--rows', type=int, default=24, help='Terminal rows (default: 24)')
     parser.add_argument('--cols', type=int, default=80, help='Terminal columns (default: 80)')
     parser.add_argument('--snapshot-dir', default=None, help='Directory containing snapshot files for EXPECT_SCREEN verification')
+    parser.add_argument('--cwd', default=None, help='Directory to run the command in (default: current directory)')
 
     args = parser.parse_args()
 
@@ -544,7 +797,7 @@ Special sequences:
 
     # Run the command
     try:
-        result = run_with_pty(command, input_tokens, args.delay, args.timeout, args.rows, args.cols, args.snapshot_dir)
+        result = run_with_pty(command, input_tokens, args.delay, args.timeout, args.rows, args.cols, args.snapshot_dir, args.cwd)
     except ScreenExpectationError as e:
         print(f"EXPECT_SCREEN failed: {e.snapshot_file}", file=sys.stderr)
         print(f"Actual screen written to: {e.tmp_path}", file=sys.stderr)